@@ -1,8 +1,10 @@
 import os
 import json
-from groq import Groq
+import threading
 import time
 
+import metrics
+
 # Configuration
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 
@@ -19,15 +21,74 @@ GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 
 GROQ_MODEL = "llama-3.1-8b-instant" 
 
-def analyze_with_groq(company_name, sectors_list, custom_sectors=None):
+# --- BATCH ---
+# Plusieurs entreprises par requête : la liste des secteurs n'est envoyée qu'une fois.
+# Budget approximatif (prompt + réponse) par requête, en tokens (~4 caractères / token).
+GROQ_BATCH_TOKEN_BUDGET = int(os.environ.get("GROQ_BATCH_TOKEN_BUDGET", "4000"))
+GROQ_BATCH_MAX_ITEMS = int(os.environ.get("GROQ_BATCH_MAX_ITEMS", "40"))
+# Réponse attendue par entreprise : {"id": 12, "sector": "...", "confidence": "High"}
+TOKENS_PER_ANSWER = 25
+
+# Réponse valide sans secteur. Tout autre détail sans secteur est un échec (clé, erreur, délai)
+AI_UNCERTAIN = "Groq: Incertain / Hors Liste"
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Single Groq client for the process (keeps its HTTP connection pool between calls)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Lazy import: the groq SDK is slow to import and only needed on the AI fallback
+                from groq import Groq
+                _client = Groq(api_key=GROQ_API_KEY)
+    return _client
+
+def is_ai_failure(sector, detail):
+    """No answer because of the upstream (missing key, error, timeout), not a model answer."""
+    return not sector and detail != AI_UNCERTAIN
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def _extract_json(content):
+    # Nettoyage basique (au cas où le modèle est bavard)
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+    return json.loads(content)
+
+def create_completion(client, **kwargs):
+    """chat.completions.create, recording latency, status (429...) and token usage in metrics."""
+    start = time.monotonic()
+    try:
+        completion = client.chat.completions.create(**kwargs)
+    except Exception as e:
+        metrics.record_upstream("groq", time.monotonic() - start, getattr(e, "status_code", None) or "error")
+        raise
+    metrics.record_upstream("groq", time.monotonic() - start, 200)
+    usage = getattr(completion, "usage", None)
+    if usage:
+        metrics.GROQ_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+        metrics.GROQ_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+    return completion
+
+def analyze_with_groq(company_name, sectors_list, custom_sectors=None, timeout=None):
     """
     Uses Groq API (Llama 3) to determine the best sector for a company.
+    `timeout` (seconds) bounds the request (client default otherwise).
     """
     if not GROQ_API_KEY:
         print("❌ ERREUR: La clé GROQ_API_KEY est manquante dans les variables d'environnement !")
         return None, "Clé API Manquante", 0
 
-    client = Groq(api_key=GROQ_API_KEY)
+    client = get_client()
+    if timeout:
+        # Bounded call: no silent client-side retries past the caller's budget
+        client = client.with_options(timeout=timeout, max_retries=0)
     
     all_sectors = sectors_list + (custom_sectors if custom_sectors else [])
     sectors_str = ", ".join([f'"{s}"' for s in all_sectors])
@@ -48,7 +109,8 @@ def analyze_with_groq(company_name, sectors_list, custom_sectors=None):
 
     try:
         # Llama 3 supports json_object response format
-        completion = client.chat.completions.create(
+        completion = create_completion(
+            client,
             model=GROQ_MODEL,
             messages=[
                 {"role": "system", "content": "Tu es un assistant JSON strict. Tu réponds uniquement en JSON."},
@@ -60,22 +122,140 @@ def analyze_with_groq(company_name, sectors_list, custom_sectors=None):
         )
         
         content = completion.choices[0].message.content
-        
-        # Nettoyage basique (au cas où le modèle est bavard)
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-            
-        result = json.loads(content)
+        result = _extract_json(content)
         sector = result.get("sector")
         
         # Validation
         if sector and sector != "Unknown" and sector in all_sectors:
             return sector, f"Groq Llama 3 ({result.get('confidence')})", 100
         else:
-            return None, "Groq: Incertain / Hors Liste", 0
+            return None, AI_UNCERTAIN, 0
 
     except Exception as e:
         print(f"Groq Error: {e}")
         return None, f"Erreur Groq: {str(e)}", 0
+
+def _batch_prompt(company_names, sectors_str):
+    companies = "\n".join(f'{i}. "{name}"' for i, name in enumerate(company_names, 1))
+    return f"""
+    Tu es un expert en classification d'entreprises.
+    Identifie le secteur d'activité de chacune des entreprises numérotées suivantes :
+{companies}
+
+    Pour chaque entreprise, tu DOIS choisir le secteur le plus pertinent PARMI cette liste stricte :
+    [{sectors_str}]
+
+    Si tu ne trouves aucune correspondance ou que l'entreprise n'existe pas, utilise "Unknown".
+
+    Réponds UNIQUEMENT avec un tableau JSON strict, un objet par entreprise, avec les clés "id", "sector", "confidence".
+    Exemple: [{{"id": 1, "sector": "Technology", "confidence": "High"}}, {{"id": 2, "sector": "Unknown", "confidence": "Low"}}]
+    """
+
+def split_by_token_budget(company_names, sectors_str, budget=None, max_items=None):
+    """Groups names so that each request (shared prompt + names + expected answers) fits the budget."""
+    budget = budget or GROQ_BATCH_TOKEN_BUDGET
+    max_items = max_items or GROQ_BATCH_MAX_ITEMS
+    base = estimate_tokens(_batch_prompt([], sectors_str))
+
+    chunks, chunk, used = [], [], base
+    for name in company_names:
+        cost = estimate_tokens(name) + 4 + TOKENS_PER_ANSWER
+        if chunk and (used + cost > budget or len(chunk) >= max_items):
+            chunks.append(chunk)
+            chunk, used = [], base
+        chunk.append(name)
+        used += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _parse_batch_answer(content, count, all_sectors):
+    """Maps the JSON array back to input positions. Raises ValueError if the answer is unusable."""
+    data = _extract_json(content)
+    if isinstance(data, dict):
+        # Certains modèles enveloppent le tableau : {"results": [...]}
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    if not isinstance(data, list):
+        raise ValueError("Réponse Groq: tableau JSON attendu")
+
+    answers = [(None, AI_UNCERTAIN, 0)] * count
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("id", position + 1)) - 1
+        except (TypeError, ValueError):
+            index = position
+        sector = item.get("sector")
+        if 0 <= index < count and sector and sector != "Unknown" and sector in all_sectors:
+            answers[index] = (sector, f"Groq Llama 3 ({item.get('confidence')})", 100)
+    return answers
+
+def _classify_chunk(client, company_names, all_sectors, sectors_str, limiter, deadline=None):
+    # `deadline` (time.monotonic()) bounds the limiter wait and the request, halves included
+    remaining = max(deadline - time.monotonic(), 0) if deadline else None
+    if limiter and not limiter.acquire(timeout=remaining):
+        return [(None, "Délai dépassé", 0)] * len(company_names)
+    if deadline:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return [(None, "Délai dépassé", 0)] * len(company_names)
+        # Bounded call: no silent client-side retries past the budget
+        client = client.with_options(timeout=remaining, max_retries=0)
+    try:
+        completion = create_completion(
+            client,
+            model=GROQ_MODEL,
+            messages=[
+                {"role": "system", "content": "Tu es un assistant JSON strict. Tu réponds uniquement en JSON."},
+                {"role": "user", "content": _batch_prompt(company_names, sectors_str)}
+            ],
+            temperature=0,
+            max_tokens=TOKENS_PER_ANSWER * len(company_names) + 100,
+        )
+    except Exception as e:
+        print(f"Groq Batch Error: {e}")
+        return [(None, f"Erreur Groq: {str(e)}", 0)] * len(company_names)
+
+    try:
+        content = completion.choices[0].message.content
+    except (IndexError, AttributeError, TypeError):
+        content = None
+    if content is None:
+        # Pas de texte (filtrage, choix vide) : redemander la même chose n'y changera rien
+        print(f"Groq Batch: réponse vide pour {len(company_names)} entreprises")
+        return [(None, "Erreur Groq: réponse vide", 0)] * len(company_names)
+
+    try:
+        return _parse_batch_answer(content, len(company_names), all_sectors)
+    except (ValueError, IndexError, AttributeError, TypeError) as e:
+        # Réponse tronquée ou mal formée : on coupe le lot en deux plutôt que de tout perdre
+        if len(company_names) == 1:
+            return [(None, f"Erreur Groq: {str(e)}", 0)]
+        print(f"Groq Batch: réponse invalide pour {len(company_names)} entreprises, découpage ({e})")
+        middle = len(company_names) // 2
+        return (_classify_chunk(client, company_names[:middle], all_sectors, sectors_str, limiter, deadline)
+                + _classify_chunk(client, company_names[middle:], all_sectors, sectors_str, limiter, deadline))
+
+def analyze_batch_with_groq(company_names, sectors_list, custom_sectors=None, limiter=None, timeout=None):
+    """
+    Classifies many companies with as few Groq requests as possible.
+    Returns one (sector, detail, score) tuple per name, in input order (same shape as analyze_with_groq).
+    `limiter` (optional) is acquired before each request. `timeout` (seconds) bounds each
+    request group (limiter wait, request and re-split halves); names past it get "Délai dépassé".
+    """
+    if not company_names:
+        return []
+    if not GROQ_API_KEY:
+        print("❌ ERREUR: La clé GROQ_API_KEY est manquante dans les variables d'environnement !")
+        return [(None, "Clé API Manquante", 0)] * len(company_names)
+
+    client = get_client()
+    all_sectors = sectors_list + (custom_sectors if custom_sectors else [])
+    sectors_str = ", ".join([f'"{s}"' for s in all_sectors])
+
+    results = []
+    for chunk in split_by_token_budget(company_names, sectors_str):
+        deadline = time.monotonic() + timeout if timeout else None
+        results.extend(_classify_chunk(client, chunk, all_sectors, sectors_str, limiter, deadline))
+    return results
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- Concurrency Configuration ---
+# Rows are classified in parallel; the real throttle is the per-upstream rate limiters below.
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "8"))
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available,
+    so callers are spaced at `rate` calls per second (with a small burst).
+    """
+
+    def __init__(self, name, rate, burst=1):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None, cancel=None):
+        """
+        Blocks until a token is available. With a timeout, gives up (returns False)
+        when the wait would exceed it; no token is consumed then. Same when the
+        `cancel` event (threading.Event) is set while waiting.
+        """
+        if self.rate <= 0:
+            return not (cancel and cancel.is_set())
+        give_up_at = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            if cancel and cancel.is_set():
+                return False
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if give_up_at is not None and now + wait > give_up_at:
+                return False
+            if cancel:
+                cancel.wait(wait)
+            else:
+                time.sleep(wait)
+
+
+# --- Per-Upstream Limiters (requests / second) ---
+# recherche-entreprises.api.gouv.fr allows ~7 req/s per IP.
+API_GOUV_LIMITER = RateLimiter("api_gouv", float(os.environ.get("API_GOUV_RATE", "6")), burst=3)
+# DuckDuckGo bans aggressive clients quickly: keep it close to the old 1 req/s pacing.
+DDG_LIMITER = RateLimiter("ddg", float(os.environ.get("DDG_RATE", "1")), burst=1)
+# Groq free tier: 30 requests / minute.
+GROQ_LIMITER = RateLimiter("groq", float(os.environ.get("GROQ_RATE", "0.5")), burst=2)
+
+
+class Deadline:
+    """Time budget of one row: every stage gets min(its own budget, time left)."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def budget(self, stage_seconds):
+        return min(stage_seconds, self.remaining())
+
+
+# Speculative upstream calls (started before we know they are needed, dropped if not)
+SPECULATIVE_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("SPECULATIVE_WORKERS", str(BATCH_MAX_WORKERS))))
+
+
+class Speculation:
+    """
+    Handle of a speculative call. cancel() drops it if it has not started yet, and otherwise
+    sets the `cancel` event the call received: it must check it before spending a rate-limiter
+    token or sending its request.
+    """
+
+    def __init__(self, fn, args):
+        self.cancelled = threading.Event()
+        self.future = SPECULATIVE_POOL.submit(fn, *args, cancel=self.cancelled)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+
+def speculate(fn, *args):
+    """Starts fn(*args, cancel=event) in the background; see Speculation."""
+    return Speculation(fn, args)
+
+
+def iter_batch(inputs, worker, max_workers=None):
+    """
+    Runs worker(item) for every item of an iterable with bounded concurrency and
+    yields (index, result) as soon as each row completes (completion order).
+    Only a small window of rows is in flight, so inputs can be a lazy generator.
+    A row that raises yields None.
+    """
+    workers = max_workers or BATCH_MAX_WORKERS
+    window = workers * 2
+
+    def safe_worker(item):
+        try:
+            return worker(item)
+        except Exception as e:
+            print(f"Batch Error on {item}: {e}")
+            return None
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    try:
+        items = enumerate(inputs)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(safe_worker, item)] = index
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    finally:
+        # Consumer went away (e.g. client disconnected): drop rows not started yet
+        pool.shutdown(wait=False, cancel_futures=True)
+
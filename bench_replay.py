@@ -0,0 +1,282 @@
+"""
+Benchmark: replays a recorded corpus (names, emails, pasted directory text) through the
+classification pipeline, fully offline.
+
+The upstreams are replaced by fixtures taken from the corpus, with injected latency:
+  gov API     local HTTP stub server (goes through http_client: pooling, retries, budgets)
+  DuckDuckGo  fixture DDGS class (replaces the duckduckgo_search module in this process)
+  Groq        fixture client answering from the corpus labels (single and batched prompts)
+Rate limiters are disabled: the numbers measure the pipeline, not the upstream quotas.
+Each pass starts from the same state (empty corrections, no Redis); pass 2+ are warm caches.
+
+Reports rows/sec, p50/p95/p99 per stage, resolving stages, memory high-water mark and
+accuracy against the corpus labels.
+Usage: python bench_replay.py [--passes 2] [--mode batch|rows] [--api-latency 80] [--web-latency 400] [--groq-latency 700]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import ModuleType, SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "replay_corpus.jsonl")
+STAGE_ORDER = ["row", "extract", "cache", "corrections", "overrides", "fuzzy", "domain", "api", "ranking", "web", "scoring", "semantic", "groq", "groq_batch"]
+
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fixture_key(name):
+    return re.sub(r"\s+", " ", name or "").strip().upper()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Latency:
+    """Injected upstream latency: `ms` +/- `jitter` (fraction), reproducible with a seed."""
+
+    def __init__(self, ms, jitter=0.2, seed=0):
+        self.ms = ms
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        if self.ms <= 0:
+            return
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(self.ms * factor / 1000)
+
+
+# --- Upstream Fixtures ---
+def start_api_stub(fixtures, latency):
+    """recherche-entreprises look-alike on 127.0.0.1: q -> recorded "results"."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+            latency.sleep()
+            body = json.dumps({"results": fixtures.get(fixture_key(query), [])}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    return stub
+
+
+def install_ddg_fixture(fixtures, latency):
+    class DDGS:
+        def __init__(self, timeout=None):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def text(self, query, region=None, max_results=None):
+            latency.sleep()
+            hit = fixtures.get(fixture_key(query.replace(" societe.com France", "")))
+            return [hit] if hit else []
+
+    module = ModuleType("duckduckgo_search")
+    module.DDGS = DDGS
+    sys.modules["duckduckgo_search"] = module
+
+
+class GroqFixture:
+    """Stands in for the Groq client: answers single and numbered (batch) prompts from the labels."""
+
+    def __init__(self, fixtures, latency):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, messages, **kwargs):
+        self.latency.sleep()
+        prompt = messages[-1]["content"]
+        numbered = re.findall(r'^(\d+)\. "(.*)"$', prompt, re.M)
+        if numbered:
+            answer = [{"id": int(i), "sector": self.fixtures.get(fixture_key(name), "Unknown"), "confidence": "High"} for i, name in numbered]
+        else:
+            name = re.search(r'suivante : "(.*)"', prompt).group(1)
+            answer = {"sector": self.fixtures.get(fixture_key(name), "Unknown"), "confidence": "High", "reasoning": "replay"}
+        content = json.dumps(answer, ensure_ascii=False)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+# --- Replay ---
+def prepare_environment(args):
+    """Offline, isolated process state. Must run before `import server`."""
+    for key in ("KV_URL", "REDIS_URL"):
+        os.environ.pop(key, None)
+    os.environ["API_GOUV_RATE"] = "0"
+    os.environ["DDG_RATE"] = "0"
+    os.environ["GROQ_RATE"] = "0"
+    os.environ.setdefault("GROQ_API_KEY", "replay")
+    os.environ["BATCH_MAX_WORKERS"] = str(args.workers)
+
+    # Corrections / custom sectors / SIRENE base are read from the working directory
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    os.environ["SIRENE_DB_PATH"] = os.path.join(workdir, "sirene.db")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+
+
+def build_fixtures(corpus, extract):
+    api, web, groq = {}, {}, {}
+    for entry in corpus:
+        key = fixture_key(entry.get("query") or extract(entry["input"])[0])
+        if "api" in entry:
+            api[key] = entry["api"]
+        if "web" in entry:
+            web[key] = entry["web"]
+        if "groq" in entry:
+            groq[key] = entry["groq"]
+    return api, web, groq
+
+
+def record_samples(metrics):
+    """Raw per-observation samples (the /metrics histograms only keep buckets)."""
+    samples = defaultdict(list)
+    for histogram, fixed_stage in ((metrics.STAGE_SECONDS, None), (metrics.ROW_SECONDS, "row")):
+        original = histogram.observe
+
+        def observe(value, _original=original, _fixed=fixed_stage, **labels):
+            samples[_fixed or labels.get("stage")].append(value)
+            _original(value, **labels)
+
+        histogram.observe = observe
+    return samples
+
+
+def run_pass(server, batch_engine, inputs, mode):
+    results = [None] * len(inputs)
+    if mode == "batch":
+        # What /api/batch, the NDJSON stream and jobs run (AI fallback grouped per Groq call)
+        for index, result in server.iter_classified(inputs):
+            results[index] = result
+    else:
+        for index, result in batch_engine.iter_batch(inputs, server.classify_row):
+            results[index] = result
+    return results
+
+
+def report(pass_no, corpus, inputs, results, elapsed, samples, resolved, peak_bytes):
+    print(f"\nPass {pass_no}: {len(inputs)} rows in {elapsed:.2f} s -> {len(inputs) / elapsed:.1f} rows/s")
+
+    print("  stage          n      p50 ms    p95 ms    p99 ms")
+    for stage in STAGE_ORDER + sorted(set(samples) - set(STAGE_ORDER)):
+        values = sorted(samples.get(stage, []))
+        if values:
+            p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+            print(f"  {stage:<12} {len(values):>5} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}")
+
+    print("  resolved by: " + ", ".join(f"{stage} {count}" for stage, count in resolved.most_common()))
+
+    labeled = [(entry, result) for entry, result in zip(corpus * (len(inputs) // len(corpus)), results) if "expected" in entry]
+    misses = [(entry, result) for entry, result in labeled if not result or result.get("Secteur") != entry["expected"]]
+    if labeled:
+        correct = len(labeled) - len(misses)
+        print(f"  accuracy: {correct}/{len(labeled)} ({correct / len(labeled):.1%})")
+    seen = set()
+    for entry, result in misses:
+        if entry["input"] in seen:
+            continue
+        seen.add(entry["input"])
+        got = result.get("Secteur") if result else None
+        print(f"    miss: {entry['input'][:40]!r} expected {entry['expected']!r}, got {got!r} ({result.get('Source') if result else '-'})")
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    memory = f"  memory: max RSS {rss_mb:.1f} MB"
+    if peak_bytes is not None:
+        memory += f", Python peak {peak_bytes / 1024 / 1024:.1f} MB (tracemalloc)"
+    print(memory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark of the classification pipeline.")
+    parser.add_argument("--corpus", default=CORPUS_FILE)
+    parser.add_argument("--passes", type=int, default=2, help="pass 1 is cold, the next ones hit the caches")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus N times per pass")
+    parser.add_argument("--mode", choices=["batch", "rows"], default="batch", help="batch: iter_classified (grouped AI); rows: one classify_row per row")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--api-latency", type=float, default=80, help="ms per gov API call")
+    parser.add_argument("--web-latency", type=float, default=400, help="ms per DuckDuckGo search")
+    parser.add_argument("--groq-latency", type=float, default=700, help="ms per Groq completion")
+    parser.add_argument("--trace-memory", action="store_true", help="Python allocation peak (tracemalloc, slower)")
+    args = parser.parse_args()
+
+    corpus_path = os.path.abspath(args.corpus)
+    prepare_environment(args)
+    corpus = load_corpus(corpus_path)
+
+    import ai_classifier
+    import batch_engine
+    import metrics
+    import server
+
+    api, web, groq = build_fixtures(corpus, server.extract_company_from_input)
+    stub = start_api_stub(api, Latency(args.api_latency, seed=1))
+    server.API_GOUV_SEARCH_URL = f"http://127.0.0.1:{stub.server_port}/search"
+    install_ddg_fixture(web, Latency(args.web_latency, seed=2))
+    ai_classifier._client = GroqFixture(groq, Latency(args.groq_latency, seed=3))
+
+    samples = record_samples(metrics)
+    inputs = [entry["input"] for entry in corpus] * args.repeat
+    print(f"Corpus: {len(corpus)} rows ({corpus_path}), mode {args.mode}, {args.workers} workers")
+    print(f"Latency: API {args.api_latency:.0f} ms, web {args.web_latency:.0f} ms, Groq {args.groq_latency:.0f} ms")
+
+    if args.trace_memory:
+        tracemalloc.start()
+    for pass_no in range(1, args.passes + 1):
+        samples.clear()
+        resolved_before = metrics.ROWS_RESOLVED.snapshot()
+        if args.trace_memory:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        results = run_pass(server, batch_engine, inputs, args.mode)
+        elapsed = time.perf_counter() - start
+
+        resolved = Counter({labels[0]: count - resolved_before.get(labels, 0) for labels, count in metrics.ROWS_RESOLVED.snapshot().items()})
+        resolved = +resolved  # drop stages that resolved nothing in this pass
+        peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+        report(pass_no, corpus, inputs, results, elapsed, samples, resolved, peak)
+
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: legacy per-keyword regex loop vs the compiled single-pass KeywordMatcher.
+Usage: python bench_scoring.py [iterations]
+"""
+import re
+import sys
+import time
+
+from matchers import KeywordMatcher
+import reference_data
+
+SECTOR_CONFIG = reference_data.get().sector_config
+
+# Realistic DuckDuckGo snippets ("<title> <body>") as scored by analyze_web_content
+SNIPPETS = [
+    "BNP PARIBAS (PARIS 9) Chiffre d'affaires, résultat, bilans sur SOCIETE.COM - 662042449 BNP PARIBAS, société anonyme, immatriculée sous le SIREN 662042449, est active depuis 58 ans. Banque, crédit agricole et financement des entreprises, épargne et prêt immobilier.",
+    "DOCTOLIB (LEVALLOIS-PERRET) Chiffre d'affaires, résultat - Doctolib est une plateforme de prise de rendez-vous médical en ligne, logiciel saas pour les médecins, cliniques et hôpitaux. Healthcare technology, software, application.",
+    "ALTECA (LYON) - Société de conseil et ESN spécialisée en transformation digitale, data, cloud computing et cybersécurité. Expertise agile, scrum, MOA / MOE et change management.",
+    "Château Margaux - Vignoble, viticulture et vin de Bordeaux. Domaine agricole producteur de grands vins, spiritueux et champagne.",
+    "GEODIS - Transport et logistique : fret, messagerie, entrepôt, supply chain, shipping, livraison de colis et transit maritime, aérien et ferroviaire.",
+    "L'Oréal - Leader mondial de la beauté : cosmétique, parfum, maquillage, skincare, personal care. Biens de consommation, hygiène, shampoing.",
+]
+
+
+def legacy_score_text(text, weights=1.0):
+    scores = {}
+    text = text.lower()
+    for sector, config in SECTOR_CONFIG.items():
+        score = 0
+        for keyword in config["keywords"]:
+            count = len(re.findall(r'\b' + re.escape(keyword) + r'\b', text))
+            score += count * weights
+        scores[sector] = score
+    return scores
+
+
+def bench(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for snippet in SNIPPETS:
+            fn(snippet, 5.0)
+    return (time.perf_counter() - start) / (iterations * len(SNIPPETS))
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(SECTOR_CONFIG)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    for snippet in SNIPPETS:
+        assert matcher.score(snippet, 5.0) == legacy_score_text(snippet, 5.0), snippet
+
+    legacy = bench(legacy_score_text, iterations)
+    compiled = bench(matcher.score, iterations)
+
+    keywords = sum(len(c["keywords"]) for c in SECTOR_CONFIG.values())
+    print(f"Keywords: {keywords} across {len(SECTOR_CONFIG)} sectors (build: {build_ms:.1f} ms)")
+    print(f"Legacy loop : {legacy * 1e6:9.1f} µs / snippet")
+    print(f"Compiled    : {compiled * 1e6:9.1f} µs / snippet")
+    print(f"Speedup     : x{legacy / compiled:.1f}")
@@ -0,0 +1,69 @@
+"""
+Benchmark: cold start of the web app (what a fresh Vercel instance pays before its first response).
+Each run is a new interpreter: `import server`, then the first request that needs the reference tables.
+Usage: python bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+import reference_data
+reference_data.get()
+loaded = time.perf_counter()
+print(imported - start, loaded - imported)
+"""
+
+HEAVY_MODULES = ["groq", "openpyxl", "redis", "bs4", "duckduckgo_search"]
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, env=env, check=True).stdout
+    import_s, data_s = out.strip().splitlines()[-1].split()
+    return float(import_s), float(data_s)
+
+
+def heavy_modules_loaded(env):
+    probe = f"import sys, server; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=env, check=True).stdout
+    return out.strip().splitlines()[-1] if out.strip() else ""
+
+
+def slowest_imports(env, count=8):
+    """Top cumulative import times from `python -X importtime` (modules imported by server.py itself)."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], capture_output=True, text=True, env=env).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Depth is encoded as indentation: direct imports of server are at one level
+        if cumulative.strip().isdigit() and name.startswith("   ") and not name.startswith("     "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    # Measure the app itself: no Redis round-trip
+    env = dict(os.environ)
+    env.pop("KV_URL", None)
+    env.pop("REDIS_URL", None)
+
+    samples = [run_once(env) for _ in range(runs)]
+    imports = [s[0] * 1000 for s in samples]
+    data = [s[1] * 1000 for s in samples]
+
+    print(f"Runs: {runs}")
+    print(f"import server      : median {statistics.median(imports):7.1f} ms   min {min(imports):7.1f} ms")
+    print(f"reference tables   : median {statistics.median(data):7.1f} ms   min {min(data):7.1f} ms (first use)")
+    print(f"Heavy modules at import: {heavy_modules_loaded(env) or 'none'}")
+    print("Slowest imports (cumulative):")
+    for micros, name in slowest_imports(env):
+        print(f"  {micros / 1000:7.1f} ms  {name}")
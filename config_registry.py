@@ -0,0 +1,201 @@
+"""
+Shared, versioned configuration: custom sectors and the competitor watchlist, compiled into
+one immutable snapshot per version, plus the reference tables (data/reference_data.json).
+
+Writers apply their edit to the stored values and bump "config:version" in one optimistic
+transaction (WATCH/MULTI), replayed when another worker wrote in between.
+Every worker checks that stamp at most every CONFIG_POLL_SECONDS (one GET) and, when it
+moved, loads and compiles a new snapshot then swaps it in with a single assignment.
+Readers only take registry.current: no lock, no network call.
+Without Redis the stamp is the files' mtimes, so local processes converge the same way.
+A change of the reference data file reloads the compiled reference tables too.
+"""
+import json
+import os
+import threading
+import time
+
+import reference_data
+from matchers import CompetitorMatcher
+
+VERSION_KEY = "config:version"
+POLL_SECONDS = float(os.environ.get("CONFIG_POLL_SECONDS", "2"))
+
+# Field -> local file (the Redis key is the field name)
+FILES = {
+    "custom_sectors": "custom_sectors.json",
+    "competitors": "competitors.json",
+}
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ConfigSnapshot:
+    """One configuration version. Never mutated: an edit builds a new snapshot."""
+
+    def __init__(self, version, custom_sectors, competitors):
+        self.version = version
+        self.custom_sectors = tuple(custom_sectors)
+        self.competitors = CompetitorMatcher(competitors)
+
+
+class ConfigRegistry:
+    def __init__(self, redis_client=None, defaults=None, poll_seconds=POLL_SECONDS, on_change=None):
+        self.redis_client = redis_client
+        self.defaults = {"custom_sectors": [], "competitors": [], **(defaults or {})}
+        self.poll_seconds = poll_seconds
+        self.on_change = on_change
+        self.current = ConfigSnapshot(None, self.defaults["custom_sectors"], self.defaults["competitors"])
+        self._reference_mtime = _mtime(reference_data.DATA_FILE)
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    # --- Version Stamp ---
+    def _version(self):
+        if self.redis_client:
+            try:
+                return ("redis", int(self.redis_client.get(VERSION_KEY) or 0))
+            except Exception as e:
+                print(f"Redis Config Version Error: {e}")
+        return ("file", tuple(_mtime(path) for path in FILES.values()))
+
+    def refresh(self, force=False):
+        """
+        Hot-path check, throttled to one stamp read per poll interval. A thread that finds
+        another one already reloading keeps the current snapshot instead of waiting.
+        """
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return self.current
+        if not self._lock.acquire(blocking=force):
+            return self.current
+        try:
+            self._next_poll = now + self.poll_seconds
+
+            reference_mtime = _mtime(reference_data.DATA_FILE)
+            reference_changed = reference_mtime != self._reference_mtime
+            if reference_changed:
+                try:
+                    reference_data.reload()
+                    self._reference_mtime = reference_mtime
+                except Exception as e:
+                    # File being edited / invalid: keep the current tables, retry next poll
+                    print(f"Reference Data Reload Error: {e}")
+                    reference_changed = False
+
+            version = self._version()
+            if version != self.current.version:
+                self.current = ConfigSnapshot(version, **self._load())
+            elif not reference_changed:
+                return self.current
+        finally:
+            self._lock.release()
+
+        if self.on_change:
+            self.on_change(self.current)
+        return self.current
+
+    # --- Load / Save ---
+    def _load(self):
+        # 1. Try Redis
+        if self.redis_client:
+            try:
+                values = self._parse(self.redis_client.mget(list(FILES)))
+                if values:
+                    return values
+            except Exception as e:
+                print(f"Redis Config Load Error: {e}")
+
+        # 2. Fallback Local
+        return self._load_files()
+
+    def _parse(self, stored):
+        found = {field: json.loads(raw) for field, raw in zip(FILES, stored) if raw}
+        return {**self.defaults, **found} if found else None
+
+    def _load_files(self):
+        values = dict(self.defaults)
+        for field, path in FILES.items():
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        values[field] = json.load(f)
+                except Exception as e:
+                    print(f"Error loading {path}: {e}")
+        return values
+
+    def add(self, field, item):
+        """Adds one custom sector / competitor and publishes a new version. Returns the new snapshot."""
+        return self._edit(field, lambda items: None if item in items else items + [item])
+
+    def remove(self, field, item):
+        return self._edit(field, lambda items: [i for i in items if i != item] if item in items else None)
+
+    def _edit(self, field, edit):
+        """
+        Applies edit(list) -> new list (None: unchanged) to the latest stored values rather
+        than to this worker's snapshot, so an edit made meanwhile by another worker is kept.
+        """
+        def apply(items):
+            changed = edit(list(items))
+            return sorted(changed) if changed is not None and field == "competitors" else changed
+
+        with self._lock:
+            snapshot = changed = None
+            if self.redis_client:
+                try:
+                    snapshot, changed = self._edit_redis(field, apply)
+                except Exception as e:
+                    print(f"Redis Config Save Error: {e}")
+            if snapshot is None:
+                values = self._load_files()
+                changed = apply(values[field])
+                if changed is not None:
+                    values[field] = changed
+
+            # Local copy (dev / Redis outage)
+            if changed is not None:
+                try:
+                    with open(FILES[field], 'w', encoding='utf-8') as f:
+                        json.dump(changed, f, ensure_ascii=False, indent=2)
+                except Exception as e:
+                    print(f"Error saving {FILES[field]}: {e}")
+
+            # Our own write must not trigger a reload on the next poll
+            self.current = snapshot or ConfigSnapshot(self._version(), **values)
+
+        if self.on_change:
+            self.on_change(self.current)
+        return self.current
+
+    def _edit_redis(self, field, apply):
+        """
+        Optimistic transaction: WATCH the version key, read the values, then SET + INCR in
+        MULTI/EXEC. A write from another worker in between aborts EXEC and the edit is
+        replayed on its values, so the version published is always the one read + 1.
+        """
+        from redis import WatchError
+
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(VERSION_KEY)
+                    version = int(pipe.get(VERSION_KEY) or 0)
+                    values = self._parse(pipe.mget(list(FILES))) or self._load_files()
+                    changed = apply(values[field])
+                    if changed is None:
+                        pipe.unwatch()
+                        return ConfigSnapshot(("redis", version), **values), None
+                    values[field] = changed
+                    pipe.multi()
+                    pipe.set(field, json.dumps(changed, ensure_ascii=False))
+                    pipe.incr(VERSION_KEY)
+                    pipe.execute()
+                    return ConfigSnapshot(("redis", version + 1), **values), changed
+                except WatchError:
+                    continue
@@ -0,0 +1,155 @@
+"""
+Email domain -> company index.
+
+CRM imports are mostly email addresses from a few hundred domains: once a domain has been
+resolved (official API result) or corrected by a user, every other address of that domain
+is answered locally, before any network call.
+
+Domains are reduced to their registrable part with a local public-suffix subset
+(reference_data "public_suffixes"): mail.bnpparibas.co.uk -> bnpparibas.co.uk.
+
+Entries expire like official cache results (TTL_OFFICIAL), so a domain that changed hands is
+resolved again, and a correction of one of its addresses drops it (forget).
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from result_cache import TTL_OFFICIAL
+
+REDIS_PREFIX = "domain:"
+
+EMAIL_PATTERN = re.compile(r"[\w.+'-]*@([\w-]+(?:\.[\w-]+)+)", re.UNICODE)
+
+
+def registrable_domain(host, public_suffixes):
+    """Longest known suffix plus one label; unknown suffixes keep the last two labels."""
+    labels = host.lower().strip(".").split(".")
+    if len(labels) < 2:
+        return None
+    for size in range(len(labels) - 1, 0, -1):
+        if ".".join(labels[-size:]) in public_suffixes:
+            return ".".join(labels[-size - 1:])
+    return ".".join(labels[-2:])
+
+
+def is_personal_domain(domain, personal_domains=(), personal_brands=()):
+    """
+    Personal mailbox: a listed domain, or a webmail brand under any suffix (gmail.fr,
+    yahoo.co.uk). ISP mailboxes (orange.fr, sfr.fr) are listed by full domain only, their
+    brand is also a company domain (orange.com).
+    """
+    return domain in personal_domains or domain.split(".")[0] in personal_brands
+
+
+def email_domain(text, public_suffixes, personal_domains=(), personal_brands=()):
+    """Registrable domain of the email address in text, or None (no email / personal mailbox)."""
+    if not text or "@" not in text or text.startswith("http"):
+        return None
+    match = EMAIL_PATTERN.search(text)
+    if not match:
+        return None
+    domain = registrable_domain(match.group(1), public_suffixes)
+    if not domain or is_personal_domain(domain, personal_domains, personal_brands):
+        return None
+    return domain
+
+
+def sectors_from_corrections(corrections, public_suffixes):
+    """
+    Domain -> sector from correction keys holding an address ("DLV@BNPPARIBAS.COM") or a
+    whole domain ("@BNPPARIBAS.COM"). A domain key wins; otherwise the most frequent sector
+    of the domain's addresses.
+    """
+    explicit = {}
+    votes = {}
+    for key, sector in corrections.items():
+        if "@" not in key:
+            continue
+        local, _, host = key.rpartition("@")
+        domain = registrable_domain(host, public_suffixes)
+        if not domain:
+            continue
+        if local:
+            votes.setdefault(domain, Counter())[sector] += 1
+        else:
+            explicit[domain] = sector
+
+    sectors = {domain: counts.most_common(1)[0][0] for domain, counts in votes.items()}
+    sectors.update(explicit)
+    return sectors
+
+
+class DomainIndex:
+    """
+    Registrable domain -> resolved company ("Nom Officiel", "siren", "Secteur", address...).
+    In-process LRU, backed by one expiring Redis key per domain shared by all workers.
+    """
+
+    def __init__(self, redis_client=None, max_entries=5000, ttl=TTL_OFFICIAL):
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, domain):
+        if not domain:
+            return None
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry:
+                expires_at, value = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(domain)
+                    return dict(value)
+                del self._entries[domain]
+
+        if self.redis_client:
+            try:
+                raw = self.redis_client.get(REDIS_PREFIX + domain)
+                if raw:
+                    value = json.loads(raw)
+                    ttl = self.redis_client.ttl(REDIS_PREFIX + domain)
+                    self._remember(domain, value, ttl if ttl and ttl > 0 else self.ttl)
+                    return dict(value)
+            except Exception as e:
+                print(f"Redis Domain Get Error: {e}")
+        return None
+
+    def learn(self, domain, entry):
+        if not domain:
+            return
+        self._remember(domain, dict(entry), self.ttl)
+        if self.redis_client:
+            try:
+                self.redis_client.setex(REDIS_PREFIX + domain, self.ttl, json.dumps(entry, ensure_ascii=False))
+            except Exception as e:
+                print(f"Redis Domain Set Error: {e}")
+
+    def forget(self, domain):
+        if not domain:
+            return
+        with self._lock:
+            self._entries.pop(domain, None)
+        if self.redis_client:
+            try:
+                self.redis_client.delete(REDIS_PREFIX + domain)
+            except Exception as e:
+                print(f"Redis Domain Delete Error: {e}")
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, domain, value, ttl):
+        with self._lock:
+            self._entries[domain] = (time.time() + ttl, value)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
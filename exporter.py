@@ -0,0 +1,154 @@
+"""
+Result exports, streamed row by row: memory stays flat whatever the number of rows.
+
+  xlsx    styled workbook (openpyxl write-only mode, shared named styles)
+  csv     ";"-separated with a UTF-8 BOM, opens directly in a French Excel
+  ndjson  one JSON object per line, for very large result sets / scripts
+"""
+import codecs
+import csv
+import io
+import itertools
+import json
+import tempfile
+
+EXPORT_HEADERS = ["Input", "Nom Officiel", "Secteur", "Adresse", "Région", "Effectif", "Lien", "Score", "Détails"]
+# Result key of each column ("Détails" is stored as "Détail")
+EXPORT_KEYS = ["Input", "Nom Officiel", "Secteur", "Adresse", "Région", "Effectif", "Lien", "Score", "Détail"]
+
+FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv; charset=utf-8"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+}
+
+# Write-only sheets need the column widths before the first row: they are sized on a sample
+WIDTH_SAMPLE_ROWS = 500
+MAX_COLUMN_WIDTH = 60
+CHUNK_SIZE = 64 * 1024
+
+
+def row_values(row):
+    return [row.get(key) for key in EXPORT_KEYS]
+
+
+def column_widths(rows):
+    widths = [len(h) for h in EXPORT_HEADERS]
+    for row in rows:
+        for i, value in enumerate(row_values(row)):
+            if value and len(str(value)) > widths[i]:
+                widths[i] = len(str(value))
+    return [min(w + 4, MAX_COLUMN_WIDTH) for w in widths]
+
+
+def _styles():
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    thin = Side(style="thin")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header = NamedStyle(
+        name="export_header",
+        font=Font(bold=True, color="FFFFFF"),
+        fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=border,
+    )
+    body = NamedStyle(name="export_body", alignment=Alignment(vertical="center"), border=border)
+    return header, body
+
+
+def write_xlsx(results, output):
+    """Styled workbook written to the binary file `output`; results can be any iterable."""
+    # Lazy import: only the export routes need openpyxl
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    results = iter(results)
+    sample = list(itertools.islice(results, WIDTH_SAMPLE_ROWS))
+
+    wb = Workbook(write_only=True)
+    header_style, body_style = _styles()
+    wb.add_named_style(header_style)
+    wb.add_named_style(body_style)
+
+    ws = wb.create_sheet("Resultats")
+    for i, width in enumerate(column_widths(sample), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = "A2"
+
+    # Named style resolved once; every cell then shares its style array (cells are never edited)
+    def style_of(name):
+        cell = WriteOnlyCell(ws)
+        cell.style = name
+        return cell._style
+
+    def styled(values, style):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value)
+            cell._style = style
+            cells.append(cell)
+        return cells
+
+    ws.append(styled(EXPORT_HEADERS, style_of("export_header")))
+    body = style_of("export_body")
+    count = 0
+    for row in itertools.chain(sample, results):
+        ws.append(styled(row_values(row), body))
+        count += 1
+
+    # Filter on the whole table (written in the sheet tail, after the rows)
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(EXPORT_HEADERS))}{count + 1}"
+    wb.save(output)
+
+
+def iter_xlsx(results):
+    """
+    Yields the .xlsx in chunks. A zip cannot be sent before it is complete, so the workbook
+    goes to a temporary file (on disk past a few MB) instead of a BytesIO.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+        write_xlsx(results, output)
+        output.seek(0)
+        while True:
+            chunk = output.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_csv(results):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    yield codecs.BOM_UTF8
+    writer.writerow(EXPORT_HEADERS)
+    for count, row in enumerate(results, start=1):
+        writer.writerow(["" if v is None else v for v in row_values(row)])
+        if count % 500 == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(results):
+    batch = []
+    for row in results:
+        batch.append(json.dumps(row, ensure_ascii=False))
+        if len(batch) >= 500:
+            yield ("\n".join(batch) + "\n").encode("utf-8")
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode("utf-8")
+
+
+def iter_export(results, fmt):
+    """Byte chunks of the export. Raises ValueError for an unknown format."""
+    if fmt == "xlsx":
+        return iter_xlsx(results)
+    if fmt == "csv":
+        return iter_csv(results)
+    if fmt == "ndjson":
+        return iter_ndjson(results)
+    raise ValueError(f"Format d'export inconnu: {fmt}")
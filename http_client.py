@@ -0,0 +1,109 @@
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# --- Outbound HTTP Configuration ---
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "10"))
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", "0.5"))
+# Never sleep longer than this on a single retry, even if Retry-After asks for more
+MAX_RETRY_DELAY = float(os.environ.get("HTTP_MAX_RETRY_DELAY", "30"))
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "20"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _build_session():
+    session = requests.Session()
+    # Keep-alive pool shared by all batch threads (no retries here: handled in get())
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "ClassifAI/1.0"
+    return session
+
+
+SESSION = _build_session()
+
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    return BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+
+def get(url, params=None, limiter=None, timeout=None, budget=None):
+    """
+    GET through the pooled session with connect/read timeouts and retries.
+    Retries connection errors, timeouts, 429 and 5xx with exponential backoff,
+    honoring Retry-After. Returns the last response, or raises the last network error.
+    `budget` (seconds) bounds the whole call, rate-limit waits and retries included.
+    """
+    host = urlparse(url).netloc
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    expires_at = time.monotonic() + budget if budget is not None else None
+
+    def time_left():
+        return expires_at - time.monotonic() if expires_at is not None else None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            metrics.UPSTREAM_RETRIES.inc(host=host)
+        if limiter and not limiter.acquire(timeout=time_left()):
+            raise requests.Timeout(f"{host}: budget exhausted waiting for rate limit")
+
+        attempt_timeout = (connect_timeout, read_timeout)
+        if expires_at is not None:
+            left = time_left()
+            if left <= 0:
+                raise requests.Timeout(f"{host}: budget exhausted")
+            attempt_timeout = (min(connect_timeout, left), min(read_timeout, left))
+
+        start = time.monotonic()
+        try:
+            response = SESSION.get(url, params=params, timeout=attempt_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            elapsed = time.monotonic() - start
+            metrics.record_upstream(host, elapsed, "error")
+            delay = _backoff(attempt)
+            if attempt == MAX_RETRIES or (expires_at is not None and delay >= time_left()):
+                raise
+            print(f"HTTP Retry ({host}): {e}")
+            time.sleep(delay)
+            continue
+
+        elapsed = time.monotonic() - start
+        metrics.record_upstream(host, elapsed, response.status_code)
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            delay = _retry_after(response)
+            if delay is None:
+                delay = _backoff(attempt)
+            delay = min(delay, MAX_RETRY_DELAY)
+            if expires_at is not None and delay >= time_left():
+                # Cannot wait that long: the caller gets the error response now
+                return response
+            time.sleep(delay)
+            continue
+        return response
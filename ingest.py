@@ -0,0 +1,137 @@
+import codecs
+import csv
+import io
+import re
+from types import SimpleNamespace
+
+# Cells that are column titles rather than companies (skipped when found in the first row)
+HEADER_LABELS = {
+    "email", "e-mail", "mail", "courriel", "nom", "name", "entreprise", "société", "societe",
+    "company", "company name", "raison sociale", "organisation", "organization", "input", "compte", "account",
+}
+
+SNIFF_BYTES = 64 * 1024
+
+
+def detect_encoding(sample):
+    """BOM first, then strict UTF-8; Excel "CSV (séparateur: point-virgule)" exports are usually cp1252."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Incremental decode: a multi-byte char cut at the end of the sample is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def column_index(column, header_row=None):
+    """
+    Resolves the requested column: header name (case-insensitive), Excel letter ("B"),
+    or 1-based number ("2"). Returns (0-based index, is_header_name).
+    """
+    if column is None or str(column).strip() == "":
+        return 0, False
+    column = str(column).strip()
+
+    if header_row:
+        labels = [str(v).strip().lower() if v is not None else "" for v in header_row]
+        if column.lower() in labels:
+            return labels.index(column.lower()), True
+    if column.isdigit():
+        return max(int(column) - 1, 0), False
+    if re.fullmatch(r"[A-Za-z]{1,3}", column):
+        index = 0
+        for ch in column.upper():
+            index = index * 26 + (ord(ch) - 64)
+        return index - 1, False
+    raise ValueError(f"Colonne introuvable: {column}")
+
+
+def _iter_csv_rows(stream):
+    sample = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    encoding = detect_encoding(sample)
+
+    text = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    try:
+        dialect = csv.Sniffer().sniff(sample.decode(encoding, errors="ignore")[:8192], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        # Do not let the wrapper close the underlying upload stream
+        text.detach()
+
+
+def _iter_excel_rows(stream):
+    # Lazy import: openpyxl is only needed for Excel uploads
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_upload_rows(file, column=None):
+    """
+    Streams the selected column of an uploaded CSV / Excel file as non-empty strings.
+    Nothing is materialized: rows flow straight to the caller (bounded memory on 100k-row files).
+    Raises ValueError for unsupported formats or unknown columns immediately: the first row
+    is read before returning, so streamed responses / jobs never start on a bad column.
+    """
+    filename = file.filename.lower()
+    if filename.endswith(".csv"):
+        rows = _iter_csv_rows(file.stream)
+    elif filename.endswith((".xls", ".xlsx")):
+        rows = _iter_excel_rows(file.stream)
+    else:
+        raise ValueError("Format non supporté (CSV ou Excel)")
+
+    try:
+        first = next(rows, None)
+        index, named = column_index(column, first) if first is not None else (0, False)
+    except Exception:
+        rows.close()
+        file.stream.close()
+        raise
+    return _iter_column(rows, first, index, named, file.stream)
+
+
+def take_upload(file):
+    """
+    Detaches the upload stream from the request, which closes its files when the view returns.
+    Needed when rows are read lazily by a streamed response.
+    """
+    owned = SimpleNamespace(filename=file.filename, stream=file.stream)
+    file.stream = io.BytesIO()
+    return owned
+
+
+def _iter_column(rows, first, index, named, stream):
+    try:
+        if first is not None:
+            yield from _select_column(rows, first, index, named)
+    finally:
+        # Reader first: the CSV text wrapper detaches from the stream in its own cleanup
+        rows.close()
+        stream.close()
+
+
+def _select_column(rows, first, index, named):
+    first_value = first[index] if len(first) > index else None
+    # First row is a header if the column was chosen by name or looks like a title
+    if not named and first_value is not None and str(first_value).strip().lower() not in HEADER_LABELS:
+        if str(first_value).strip():
+            yield str(first_value).strip()
+
+    for row in rows:
+        if row and len(row) > index and row[index] is not None:
+            value = str(row[index]).strip()
+            if value:
+                yield value
@@ -0,0 +1,322 @@
+"""
+Background jobs for large imports.
+
+A job is a list of input rows classified by a worker outside the HTTP request.
+Every row result is checkpointed as soon as it completes, so a crashed or
+redeployed worker resumes where it stopped (rows already done are skipped).
+
+Storage is Redis when available (shared by web processes and workers), with an
+in-process fallback for local runs. Workers run as threads inside the web process,
+or standalone on a long-lived host:
+    python jobs.py worker
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+JOB_TTL = int(os.environ.get("JOB_TTL", str(7 * 24 * 3600)))
+# A running job whose worker has not reported for this long is considered orphaned
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", "120"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+# A standalone "python jobs.py worker" runs on a long-lived host (serverless web processes)
+JOB_EXTERNAL_WORKER = os.environ.get("JOB_EXTERNAL_WORKER", "0") == "1"
+INPUT_PAGE_SIZE = 500
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+class MemoryJobStore:
+    """In-process store: local development / no Redis. Jobs die with the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = []
+        self._queue_event = threading.Event()
+
+    def create(self, job_id, meta):
+        with self._lock:
+            self._jobs[job_id] = {"meta": dict(meta), "inputs": [], "results": {}, "done": []}
+
+    def push_inputs(self, job_id, lines):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["inputs"].extend(lines)
+            job["meta"]["total"] = len(job["inputs"])
+
+    def get_meta(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job["meta"]) if job else None
+
+    def update_meta(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id]["meta"].update(fields)
+
+    def get_inputs(self, job_id, start, end):
+        with self._lock:
+            return self._jobs[job_id]["inputs"][start:end]
+
+    def save_result(self, job_id, index, result):
+        with self._lock:
+            job = self._jobs[job_id]
+            if index not in job["results"]:
+                job["done"].append(index)
+                job["meta"]["processed"] = job["meta"].get("processed", 0) + 1
+            job["results"][index] = result
+            job["meta"]["heartbeat"] = time.time()
+
+    def done_indices(self, job_id):
+        with self._lock:
+            return set(self._jobs[job_id]["results"])
+
+    def get_results_since(self, job_id, cursor, limit):
+        with self._lock:
+            job = self._jobs[job_id]
+            indices = job["done"][cursor:cursor + limit]
+            return [(i, job["results"][i]) for i in indices]
+
+    def iter_results_ordered(self, job_id, page_size=INPUT_PAGE_SIZE):
+        with self._lock:
+            indices = sorted(self._jobs[job_id]["results"])
+        for start in range(0, len(indices), page_size):
+            with self._lock:
+                results = self._jobs[job_id]["results"]
+                page = [results[i] for i in indices[start:start + page_size]]
+            yield from page
+
+    def enqueue(self, job_id):
+        with self._lock:
+            self._queue.append(job_id)
+        self._queue_event.set()
+
+    def dequeue(self, timeout):
+        self._queue_event.wait(timeout)
+        with self._lock:
+            if not self._queue:
+                self._queue_event.clear()
+                return None
+            return self._queue.pop(0)
+
+    def recover_stale(self):
+        return []
+
+
+class RedisJobStore:
+    """
+    Redis layout:
+      job:<id>          hash   status, total, processed, filename, created, heartbeat
+      job:<id>:inputs   list   raw input rows
+      job:<id>:results  hash   row index -> result JSON (checkpoints)
+      job:<id>:done     list   row indices in completion order (cursor for partial results)
+      jobs:queue        list   job ids waiting for a worker
+      jobs:running      set    job ids currently claimed by a worker
+    """
+
+    def __init__(self, redis_client):
+        self.r = redis_client
+
+    def _key(self, job_id, suffix=""):
+        return f"job:{job_id}{suffix}"
+
+    def _touch(self, pipe, job_id):
+        for suffix in ("", ":inputs", ":results", ":done"):
+            pipe.expire(self._key(job_id, suffix), JOB_TTL)
+
+    def create(self, job_id, meta):
+        pipe = self.r.pipeline()
+        pipe.hset(self._key(job_id), mapping={k: json.dumps(v) for k, v in meta.items()})
+        self._touch(pipe, job_id)
+        pipe.execute()
+
+    def push_inputs(self, job_id, lines):
+        if not lines:
+            return
+        pipe = self.r.pipeline()
+        pipe.rpush(self._key(job_id, ":inputs"), *lines)
+        pipe.hincrby(self._key(job_id), "total", len(lines))
+        self._touch(pipe, job_id)
+        pipe.execute()
+
+    def get_meta(self, job_id):
+        raw = self.r.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {k.decode("utf-8"): json.loads(v) for k, v in raw.items()}
+
+    def update_meta(self, job_id, **fields):
+        self.r.hset(self._key(job_id), mapping={k: json.dumps(v) for k, v in fields.items()})
+
+    def get_inputs(self, job_id, start, end):
+        return [v.decode("utf-8") for v in self.r.lrange(self._key(job_id, ":inputs"), start, end - 1)]
+
+    def save_result(self, job_id, index, result):
+        # HSETNX: a row replayed after a crash is only counted once
+        if self.r.hsetnx(self._key(job_id, ":results"), index, json.dumps(result, ensure_ascii=False)):
+            pipe = self.r.pipeline()
+            pipe.rpush(self._key(job_id, ":done"), index)
+            pipe.hincrby(self._key(job_id), "processed", 1)
+            pipe.hset(self._key(job_id), "heartbeat", json.dumps(time.time()))
+            pipe.execute()
+
+    def done_indices(self, job_id):
+        return {int(i) for i in self.r.hkeys(self._key(job_id, ":results"))}
+
+    def get_results_since(self, job_id, cursor, limit):
+        indices = self.r.lrange(self._key(job_id, ":done"), cursor, cursor + limit - 1)
+        if not indices:
+            return []
+        values = self.r.hmget(self._key(job_id, ":results"), indices)
+        return [(int(i), json.loads(v)) for i, v in zip(indices, values) if v]
+
+    def iter_results_ordered(self, job_id, page_size=INPUT_PAGE_SIZE):
+        """Results in row order, fetched page by page (exports of very large jobs)."""
+        total = int(self.r.hget(self._key(job_id), "total") or 0)
+        for start in range(0, total, page_size):
+            values = self.r.hmget(self._key(job_id, ":results"), list(range(start, min(start + page_size, total))))
+            for value in values:
+                if value:
+                    yield json.loads(value)
+
+    def enqueue(self, job_id):
+        self.r.lpush("jobs:queue", job_id)
+
+    def dequeue(self, timeout):
+        item = self.r.brpop("jobs:queue", timeout=max(int(timeout), 1))
+        if not item:
+            return None
+        job_id = item[1].decode("utf-8")
+        self.r.sadd("jobs:running", job_id)
+        return job_id
+
+    def release(self, job_id):
+        self.r.srem("jobs:running", job_id)
+
+    def recover_stale(self):
+        """Re-queues running jobs whose worker stopped reporting (crash / redeploy)."""
+        recovered = []
+        for raw_id in self.r.smembers("jobs:running"):
+            job_id = raw_id.decode("utf-8")
+            meta = self.get_meta(job_id)
+            if not meta:
+                self.r.srem("jobs:running", job_id)
+                continue
+            heartbeat = meta.get("heartbeat") or meta.get("created") or 0
+            if meta.get("status") in ("queued", "running") and time.time() - heartbeat > JOB_STALE_AFTER:
+                if self.r.srem("jobs:running", job_id):
+                    self.update_meta(job_id, status="queued")
+                    self.enqueue(job_id)
+                    recovered.append(job_id)
+        return recovered
+
+
+class JobManager:
+    """
+    Creates jobs and runs worker threads that classify their rows with `classify_many(lines)`,
+    a generator yielding (position, result) in completion order (e.g. batch_engine.iter_batch
+    bound to a row classifier, or server.iter_classified which groups the AI fallback).
+    """
+
+    def __init__(self, store, classify_many):
+        self.store = store
+        self.classify_many = classify_many
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def create_job(self, lines, filename=""):
+        """lines can be any iterable (e.g. a streaming file reader): it is stored page by page."""
+        job_id = new_job_id()
+        now = time.time()
+        self.store.create(job_id, {"status": "queued", "total": 0, "processed": 0, "filename": filename, "created": now, "heartbeat": now})
+
+        page = []
+        for line in lines:
+            page.append(line)
+            if len(page) >= INPUT_PAGE_SIZE:
+                self.store.push_inputs(job_id, page)
+                page = []
+        self.store.push_inputs(job_id, page)
+
+        self.store.enqueue(job_id)
+        return job_id
+
+    def ensure_workers(self, count=None):
+        with self._lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            for _ in range((count or JOB_WORKERS) - len(self._workers)):
+                thread = threading.Thread(target=self.run_worker, daemon=True)
+                thread.start()
+                self._workers.append(thread)
+
+    def run_worker(self, stop_event=None):
+        while not (stop_event and stop_event.is_set()):
+            try:
+                job_id = self.store.dequeue(timeout=5)
+                if not job_id:
+                    recovered = self.store.recover_stale()
+                    if recovered:
+                        print(f"Jobs recovered: {recovered}")
+                    continue
+                self.process_job(job_id)
+            except Exception as e:
+                print(f"Job Worker Error: {e}")
+                time.sleep(1)
+
+    def process_job(self, job_id):
+        meta = self.store.get_meta(job_id)
+        if not meta:
+            return
+        total = meta.get("total", 0)
+        self.store.update_meta(job_id, status="running", heartbeat=time.time())
+
+        try:
+            done = self.store.done_indices(job_id)
+
+            # position in the pending stream -> row index, for rows not saved yet
+            indices = {}
+
+            def pending_rows():
+                # Resume: rows checkpointed by a previous (crashed) run are skipped
+                position = 0
+                for start in range(0, total, INPUT_PAGE_SIZE):
+                    page = self.store.get_inputs(job_id, start, start + INPUT_PAGE_SIZE)
+                    for offset, line in enumerate(page):
+                        if start + offset not in done:
+                            indices[position] = start + offset
+                            position += 1
+                            yield line
+
+            for position, result in self.classify_many(pending_rows()):
+                index = indices.pop(position)
+                if result is not None:
+                    self.store.save_result(job_id, index, result)
+
+            self.store.update_meta(job_id, status="done", finished=time.time())
+        except Exception as e:
+            print(f"Job {job_id} Error: {e}")
+            self.store.update_meta(job_id, status="error", error=str(e))
+        finally:
+            if hasattr(self.store, "release"):
+                self.store.release(job_id)
+
+
+def create_store(redis_client):
+    return RedisJobStore(redis_client) if redis_client else MemoryJobStore()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "worker":
+        sys.exit("Usage: python jobs.py worker")
+
+    import server
+
+    if not server.redis_client:
+        sys.exit("A standalone worker needs Redis (KV_URL / REDIS_URL)")
+    print("Job worker started")
+    server.get_job_manager().run_worker()
@@ -0,0 +1,254 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Tokens users append to names that the registry denomination usually lacks
+LEGAL_FORMS = {"SA", "SAS", "SASU", "SARL", "EURL", "SE", "SCA", "SNC", "GROUP", "GROUPE", "HOLDING", "INC", "LTD", "CORP"}
+
+
+def normalize_name(name):
+    """Uppercase, accents stripped, punctuation collapsed to single spaces."""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return re.sub(r"[^A-Z0-9]+", " ", name.upper()).strip()
+
+
+def trie_pattern(words):
+    """
+    Builds a regex alternation shaped like a trie (shared prefixes factored out),
+    so the engine walks each candidate once instead of trying every word in turn.
+    Longer words win over their prefixes (greedy optional groups).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _pattern(node):
+        branches = [re.escape(ch) + _pattern(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return _pattern(trie)
+
+
+class KeywordMatcher:
+    """
+    Precompiled keyword scorer for SECTOR_CONFIG.
+    Scores every sector in a single pass over the text, with the same counts as
+    running re.findall(r'\\b' + re.escape(keyword) + r'\\b') per keyword.
+    """
+
+    def __init__(self, sector_config):
+        self.sectors = list(sector_config.keys())
+
+        keyword_sectors = {}
+        for sector, config in sector_config.items():
+            for keyword in config.get("keywords", []):
+                keyword_sectors.setdefault(keyword, Counter())[sector] += 1
+
+        # A match of "crédit agricole" at some position is also a match of "crédit":
+        # precompute, per keyword, every (sector, count) it contributes.
+        self._hits = {}
+        for keyword in keyword_sectors:
+            hits = Counter(keyword_sectors[keyword])
+            for i in range(1, len(keyword)):
+                prefix = keyword[:i]
+                if prefix in keyword_sectors and not _is_word_char(keyword[i]):
+                    hits.update(keyword_sectors[prefix])
+            self._hits[keyword] = list(hits.items())
+
+        # Zero-width lookahead: every word start is tested, so overlapping keywords all count
+        if keyword_sectors:
+            self._regex = re.compile(r"\b(?=(" + trie_pattern(keyword_sectors) + r")\b)")
+        else:
+            self._regex = None
+
+    def score(self, text, weights=1.0):
+        scores = dict.fromkeys(self.sectors, 0 * weights)
+        if not self._regex or not text:
+            return scores
+        for match in self._regex.finditer(text.lower()):
+            for sector, count in self._hits[match.group(1)]:
+                scores[sector] += count * weights
+        return scores
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class NafIndex:
+    """
+    Longest-prefix index over the "naf_prefixes" of SECTOR_CONFIG.
+    Lookup tries each prefix length of the code once: O(len(code)).
+    A prefix declared by several sectors is reported at build time and resolved
+    through `owners` (prefix -> sector); unresolved ones keep the first declaration.
+    """
+
+    def __init__(self, sector_config, owners=None):
+        owners = owners or {}
+        self.by_prefix = {}
+        self.conflicts = {}
+
+        for sector, config in sector_config.items():
+            for prefix in config.get("naf_prefixes", []):
+                prefix = prefix.replace(".", "").upper()
+                if prefix in self.by_prefix and self.by_prefix[prefix] != sector:
+                    self.conflicts.setdefault(prefix, [self.by_prefix[prefix]]).append(sector)
+                    continue
+                self.by_prefix[prefix] = sector
+
+        for prefix, sectors in self.conflicts.items():
+            owner = owners.get(prefix)
+            if owner in sectors:
+                self.by_prefix[prefix] = owner
+            else:
+                print(f"NAF prefix conflict: '{prefix}' declared by {sectors}, keeping '{self.by_prefix[prefix]}'")
+
+        self.max_len = max((len(p) for p in self.by_prefix), default=0)
+
+    def lookup(self, naf_code):
+        if not naf_code:
+            return None
+        code = naf_code.replace(".", "").upper()
+        for length in range(min(len(code), self.max_len), 0, -1):
+            sector = self.by_prefix.get(code[:length])
+            if sector:
+                return sector
+        return None
+
+
+class CompetitorMatcher:
+    """
+    Competitor watchlist compiled into one word-bounded alternation: the cost of a lookup
+    no longer grows with the list. Same results as testing
+    re.search(r'\b' + re.escape(name) + r'\b', text.upper()) for every name.
+    Immutable: a watchlist edit builds a new matcher.
+    """
+
+    def __init__(self, names):
+        self.names = frozenset(n.strip().upper() for n in names if n and n.strip())
+        if self.names:
+            self._regex = re.compile(r"\b(?:" + trie_pattern(self.names) + r")\b")
+        else:
+            self._regex = None
+
+    def __contains__(self, name):
+        return bool(name) and name.strip().upper() in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, text):
+        """Watchlist name found in text, or None."""
+        if not self._regex or not text:
+            return None
+        found = self._regex.search(text.upper())
+        return found.group(0) if found else None
+
+
+# Words that do not identify a company: "Groupe X", "X SAS" and "X France" are all X
+NAME_NOISE = LEGAL_FORMS | {"FRANCE", "EUROPE", "INTERNATIONAL"}
+
+
+def name_signature(name):
+    """Normalized name without legal forms / noise words (kept if nothing else remains)."""
+    tokens = normalize_name(name).split()
+    core = [token for token in tokens if token not in NAME_NOISE]
+    return " ".join(core or tokens)
+
+
+class NgramIndex:
+    """
+    Character n-gram TF-IDF index over company names, queried by cosine similarity.
+    Names are reduced to name_signature() first. add() is incremental (IDF is read at query
+    time); search() only scores names sharing at least one n-gram with the query.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self._docs = {}       # signature -> (n-gram counts, value, original name)
+        self._postings = {}   # n-gram -> signatures containing it
+        self._norms = {}      # signature -> vector norm under the current IDF (lazy)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _grams(self, signature):
+        padded = f" {signature} "
+        return Counter(padded[i:i + self.n] for i in range(max(len(padded) - self.n + 1, 1)))
+
+    def _idf(self, gram):
+        return math.log((1 + len(self._docs)) / (1 + len(self._postings.get(gram, ())))) + 1
+
+    def _norm(self, signature):
+        norm = self._norms.get(signature)
+        if norm is None:
+            grams = self._docs[signature][0]
+            norm = math.sqrt(sum((tf * self._idf(g)) ** 2 for g, tf in grams.items()))
+            self._norms[signature] = norm
+        return norm
+
+    def add(self, name, value, replace=True):
+        """Indexes name -> value. With replace=False an already indexed signature is kept."""
+        signature = name_signature(name)
+        if not signature:
+            return
+        with self._lock:
+            existing = self._docs.get(signature)
+            if existing:
+                if not replace or existing[1] == value:
+                    return
+                self._docs[signature] = (existing[0], value, name)
+                return
+            grams = self._grams(signature)
+            self._docs[signature] = (grams, value, name)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(signature)
+            # Document frequencies moved: norms are recomputed on demand
+            self._norms.clear()
+
+    def search(self, name, threshold=0.0):
+        """Returns (value, matched name, similarity) for the closest indexed name, or None below threshold."""
+        signature = name_signature(name)
+        if not signature:
+            return None
+        with self._lock:
+            exact = self._docs.get(signature)
+            if exact:
+                return exact[1], exact[2], 1.0
+
+            weights = {g: tf * self._idf(g) for g, tf in self._grams(signature).items()}
+            query_norm = math.sqrt(sum(w * w for w in weights.values()))
+            dots = Counter()
+            for gram, weight in weights.items():
+                postings = self._postings.get(gram)
+                if not postings:
+                    continue
+                idf = self._idf(gram)
+                for candidate in postings:
+                    dots[candidate] += weight * self._docs[candidate][0][gram] * idf
+
+            best, best_score = None, 0.0
+            for candidate, dot in dots.items():
+                score = dot / (query_norm * self._norm(candidate))
+                if score > best_score:
+                    best, best_score = candidate, score
+
+            if best is None or best_score < threshold:
+                return None
+            _, value, matched = self._docs[best]
+            return value, matched, best_score
+
@@ -0,0 +1,205 @@
+"""
+In-process metrics for the classification pipeline, exposed in the Prometheus text
+format on /metrics (no client library needed).
+
+  classify_stage_seconds        time spent per pipeline stage (extract, corrections, api, ranking, web, groq...)
+  classify_rows_total           rows by the stage that resolved them
+  result_cache_lookups_total    result cache hits / misses
+  upstream_requests_total       outbound calls by host and status (429 / 5xx / error included)
+  upstream_retries_total        retried outbound calls by host (http_client)
+  groq_tokens_total             Groq quota usage (prompt / completion tokens)
+
+Values are per process: each worker exposes its own, Prometheus sums them.
+A per-request breakdown of the stage timings is available through trace().
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        """Label values tuple -> current value."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram (seconds by default), optionally split by labels."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """Label values tuple -> (sum, count)."""
+        with self._lock:
+            return {key: (series[-2], series[-1]) for key, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Pipeline Metrics ---
+STAGE_SECONDS = Histogram("classify_stage_seconds", "Time spent in each classification stage.", ["stage"])
+ROW_SECONDS = Histogram("classify_row_seconds", "End-to-end classification time of one row.")
+ROWS_RESOLVED = Counter("classify_rows_total", "Classified rows by the stage that resolved them.", ["resolved_by"])
+PARTIAL_ROWS = Counter("classify_partial_rows_total", "Rows answered after a stage was cut short (timeout / upstream error).")
+CACHE_LOOKUPS = Counter("result_cache_lookups_total", "Result cache lookups.", ["result"])
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Outbound calls by host and status (error = network failure).", ["host", "status"])
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Latency of outbound calls.", ["host"])
+UPSTREAM_RETRIES = Counter("upstream_retries_total", "Retried outbound calls (http_client).", ["host"])
+GROQ_TOKENS = Counter("groq_tokens_total", "Groq tokens used (quota).", ["kind"])
+
+_local = threading.local()
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+class Stopwatch:
+    """Consecutive stages of one function: lap(stage) records the time since the previous lap."""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        observe_stage(stage, now - self._last)
+        self._last = now
+
+
+@contextmanager
+def trace():
+    """
+    Collects the stage timings of the current thread (one request) into a dict of
+    milliseconds. Stages run on other threads (speculative web search, batched Groq)
+    only appear as the time spent waiting for them.
+    """
+    previous = getattr(_local, "timings", None)
+    _local.timings = {}
+    breakdown = {}
+    try:
+        yield breakdown
+    finally:
+        breakdown.update({stage: round(seconds * 1000, 2) for stage, seconds in _local.timings.items()})
+        _local.timings = previous
+
+
+def record_upstream(host, seconds, status):
+    UPSTREAM_REQUESTS.inc(host=host, status=status)
+    UPSTREAM_SECONDS.observe(seconds, host=host)
+
+
+def upstream_stats():
+    """Per-host summary of the upstream_* series, for /api/stats (JSON)."""
+    hosts = {}
+
+    def host_stats(host):
+        return hosts.setdefault(host, {"requests": 0, "errors": 0, "retries": 0, "status": {}, "latency_total": 0.0, "latency_avg": 0.0})
+
+    for (host, status), count in UPSTREAM_REQUESTS.snapshot().items():
+        stats = host_stats(host)
+        stats["requests"] += count
+        stats["status"][status] = count
+        if status == "error" or status == "429" or status.startswith("5"):
+            stats["errors"] += count
+    for (host,), count in UPSTREAM_RETRIES.snapshot().items():
+        host_stats(host)["retries"] = count
+    for (host,), (total, count) in UPSTREAM_SECONDS.snapshot().items():
+        stats = host_stats(host)
+        stats["latency_total"] = total
+        stats["latency_avg"] = total / count if count else 0.0
+    return hosts
@@ -0,0 +1,81 @@
+"""
+Ranking of the registry candidates (API / local SIRENE) of one lookup.
+
+The API returns up to 5 companies per query, in full-text relevance order: a small homonym,
+a holding or the works council of the company often comes first. Every candidate is scored
+on the same features, computed column by column over the candidate list, then combined with
+WEIGHTS in one pass:
+
+  name        similarity to the searched name (character bigrams / token coverage)
+  headcount   tranche_effectif_salarie, by bracket order (reference_data "tranche_effectifs")
+  active      etat_administratif != "C" (ceased companies)
+  siege       head office known (address / postcode)
+  order       API relevance order, as a tie-breaker
+  council     works council (COMITE / CSE): never the company itself
+  holding     NAF code in the blacklist (holdings: no business sector)
+"""
+from matchers import name_signature
+
+WEIGHTS = {
+    "name": 0.5,
+    "headcount": 0.15,
+    "active": 0.15,
+    "siege": 0.05,
+    "order": 0.15,
+    "council": -1.0,
+    "holding": -0.25,
+}
+
+
+def _bigrams(signature):
+    padded = f" {signature} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def name_similarity(query, name):
+    """0..1 between two name signatures: bigram Dice, or the share of query words found in name."""
+    if not query or not name:
+        return 0.0
+    a, b = _bigrams(query), _bigrams(name)
+    dice = 2 * len(a & b) / (len(a) + len(b))
+    words = query.split()
+    coverage = sum(1 for word in words if word in name.split()) / len(words)
+    return max(dice, 0.9 * coverage)
+
+
+def is_works_council(name):
+    upper = (name or "").upper()
+    return "COMITE" in upper or "CSE " in upper
+
+
+def naf_key(code):
+    return (code or "").replace(".", "").upper()
+
+
+def rank_candidates(name, candidates, tranche_codes=(), naf_blacklist=()):
+    """Returns [(score, candidate)] best first (API order kept between equal scores)."""
+    if not candidates:
+        return []
+    query = name_signature(name)
+    count = len(candidates)
+    # Bracket codes in increasing size; "NN" / unknown count as 0
+    levels = {code: i / max(len(tranche_codes) - 1, 1) for i, code in enumerate(tranche_codes) if code != "NN"}
+    blacklist = {naf_key(code) for code in naf_blacklist}
+    names = [c.get("nom_complet") or "" for c in candidates]
+    sieges = [c.get("siege") or {} for c in candidates]
+
+    columns = {
+        "name": [max(name_similarity(query, name_signature(n)), name_similarity(query, name_signature(c.get("sigle") or "")))
+                 for n, c in zip(names, candidates)],
+        "headcount": [levels.get(c.get("tranche_effectif_salarie"), 0.0) for c in candidates],
+        "active": [0.0 if c.get("etat_administratif") == "C" else 1.0 for c in candidates],
+        "siege": [1.0 if s.get("adresse") or s.get("code_postal") else 0.0 for s in sieges],
+        "order": [1 - i / count for i in range(count)],
+        "council": [1.0 if is_works_council(n) else 0.0 for n in names],
+        "holding": [1.0 if naf_key(c.get("activite_principale")) in blacklist else 0.0 for c in candidates],
+    }
+    weights = [WEIGHTS[feature] for feature in columns]
+    scores = [sum(w * v for w, v in zip(weights, row)) for row in zip(*columns.values())]
+
+    order = sorted(range(count), key=lambda i: -scores[i])
+    return [(round(scores[i], 4), candidates[i]) for i in order]
@@ -0,0 +1,78 @@
+"""
+Static reference tables (data/reference_data.json): departments -> regions, sector config
+(keywords / NAF prefixes), headcount brackets, the global overrides and the email domain
+suffixes.
+
+The file is read on first use, not at import (cold starts), and compiled once into the
+lookup indexes the classifier needs. Bump "version" in the file when editing it.
+"""
+import json
+import os
+import threading
+
+from matchers import KeywordMatcher, NafIndex, NgramIndex
+
+DATA_FILE = os.environ.get("REFERENCE_DATA_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reference_data.json"))
+
+_current = None
+_lock = threading.Lock()
+
+
+def compact_key(name):
+    """Override key without spaces / dots / dashes: "CLUB-MED" -> "CLUBMED"."""
+    return name.replace(" ", "").replace(".", "").replace("-", "")
+
+
+class ReferenceData:
+    """Read-only tables plus the indexes compiled from them."""
+
+    def __init__(self, raw):
+        self.version = raw["version"]
+        self.dept_to_region = raw["dept_to_region"]
+        self.sector_config = raw["sector_config"]
+        self.sectors = list(self.sector_config.keys())
+        self.tranche_effectifs = raw["tranche_effectifs"]
+        self.global_overrides = raw["global_overrides"]
+        # Email domains (domain_index): registrable-domain suffixes and personal mailboxes
+        # (full domains, plus webmail brands matched in every country variant)
+        self.public_suffixes = frozenset(raw.get("public_suffixes", []))
+        self.personal_email_domains = frozenset(raw.get("personal_email_domains", []))
+        self.personal_email_brands = frozenset(raw.get("personal_email_brands", []))
+
+        self.keyword_matcher = KeywordMatcher(self.sector_config)
+        self.naf_index = NafIndex(self.sector_config, raw.get("naf_prefix_owners"))
+
+        # Maps "COCACOLA" -> "COCA COLA", plus explicit typos / variations (normalized -> real key)
+        self.normalized_overrides = {compact_key(k): k for k in self.global_overrides}
+        self.normalized_overrides.update(raw.get("override_aliases", {}))
+
+        # Fuzzy lookup: name / alias -> GLOBAL_OVERRIDES key (bigrams, see server.fuzzy_lookup)
+        self.override_index = NgramIndex(n=2)
+        for name in self.global_overrides:
+            self.override_index.add(name, name)
+        for alias, name in self.normalized_overrides.items():
+            self.override_index.add(alias, name, replace=False)
+
+
+def load(path=None):
+    with open(path or DATA_FILE, "r", encoding="utf-8") as f:
+        return ReferenceData(json.load(f))
+
+
+def get():
+    """Compiled tables, loaded on first call."""
+    global _current
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _current = load()
+    return _current
+
+
+def reload():
+    """Re-reads the data file (after an edit) and swaps the compiled tables."""
+    global _current
+    data = load()
+    with _lock:
+        _current = data
+    return data
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- TTL per Source (seconds) ---
+# Official registry data barely moves; web/AI guesses are re-checked more often,
+# and "Non Trouvé" is only remembered briefly (negative caching).
+TTL_OFFICIAL = int(os.environ.get("CACHE_TTL_OFFICIAL", str(30 * 24 * 3600)))
+TTL_GUESS = int(os.environ.get("CACHE_TTL_GUESS", str(24 * 3600)))
+TTL_NEGATIVE = int(os.environ.get("CACHE_TTL_NEGATIVE", str(3600)))
+
+OFFICIAL_SOURCES = {"Officiel (API)", "Officiel (SIRENE)", "Base Interne", "Mémoire", "Mémoire (Domaine)"}
+
+REDIS_PREFIX = "classif:"
+
+
+def ttl_for_result(result):
+    """Returns the TTL to apply to a classification result, or 0 if it must not be cached."""
+    sector = result.get("Secteur")
+    source = result.get("Source")
+    if sector == "Erreur" or source == "Crash" or result.get("Partiel"):
+        return 0
+    if sector == "Non Trouvé":
+        return TTL_NEGATIVE
+    if source in OFFICIAL_SOURCES:
+        return TTL_OFFICIAL
+    return TTL_GUESS
+
+
+class ResultCache:
+    """
+    Two-tier cache for categorize_company_logic results, keyed on the normalized company name.
+    Front: in-process LRU. Back: Redis (shared across workers), when available.
+    Stored results never contain "Input": callers re-attach their own raw input.
+    Redis keys are namespaced by reference data version (set_generation): after a change of
+    the reference tables, rows cached under the previous one are no longer read and expire.
+    Rows stored with a tag (their custom sector) can be dropped together (invalidate_tag).
+    """
+
+    def __init__(self, redis_client=None, max_entries=5000):
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self._prefix = REDIS_PREFIX
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not key:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    return dict(value)
+                del self._lru[key]
+
+        if self.redis_client:
+            try:
+                raw = self.redis_client.get(self._prefix + key)
+                if raw:
+                    value = json.loads(raw)
+                    ttl = self.redis_client.ttl(self._prefix + key)
+                    self._remember(key, value, ttl if ttl and ttl > 0 else TTL_NEGATIVE)
+                    return dict(value)
+            except Exception as e:
+                print(f"Redis Cache Get Error: {e}")
+        return None
+
+    def set(self, key, result, shared=True, tag=None):
+        """shared=False keeps the result in this process only (no Redis write)."""
+        if not key:
+            return
+        ttl = ttl_for_result(result)
+        if ttl <= 0:
+            return
+
+        value = {k: v for k, v in result.items() if k != "Input"}
+        self._remember(key, value, ttl)
+
+        if shared and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.setex(self._prefix + key, ttl, json.dumps(value, ensure_ascii=False))
+                if tag:
+                    # Tag index outlives every row it lists (TTL_OFFICIAL is the longest)
+                    pipe.sadd(self._tag_key(tag), key)
+                    pipe.expire(self._tag_key(tag), TTL_OFFICIAL)
+                pipe.execute()
+            except Exception as e:
+                print(f"Redis Cache Set Error: {e}")
+
+    def invalidate(self, key):
+        with self._lock:
+            self._lru.pop(key, None)
+        if self.redis_client:
+            try:
+                self.redis_client.delete(self._prefix + key)
+            except Exception as e:
+                print(f"Redis Cache Delete Error: {e}")
+
+    def invalidate_tag(self, tag):
+        """Drops the rows stored with this tag from Redis, and this process's LRU."""
+        self.clear_local()
+        if self.redis_client:
+            try:
+                tag_key = self._tag_key(tag)
+                keys = [self._prefix + key.decode("utf-8") for key in self.redis_client.smembers(tag_key)]
+                self.redis_client.delete(tag_key, *keys)
+            except Exception as e:
+                print(f"Redis Cache Delete Error: {e}")
+
+    def clear_local(self):
+        with self._lock:
+            self._lru.clear()
+
+    def _tag_key(self, tag):
+        return f"{self._prefix}tag:{tag}"
+
+    def set_generation(self, generation):
+        with self._lock:
+            self._prefix = f"{REDIS_PREFIX}{generation}:" if generation else REDIS_PREFIX
+            self._lru.clear()
+
+    def _remember(self, key, value, ttl):
+        with self._lock:
+            self._lru[key] = (time.time() + ttl, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
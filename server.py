@@ -1,21 +1,17 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, Response
 from flask_cors import CORS
 # import pandas as pd # Removed for size optimization
-import csv
-import io
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+# openpyxl / groq / redis are imported on first use (cold start): see exporter, ai_classifier, LazyRedis
 
-import requests
-from bs4 import BeautifulSoup
 # from duckduckgo_search import DDGS # Moved to local scope for safety
 import time
 import re
+import threading
 from urllib.parse import urlparse
 
 import json
 import os
-import redis
+from types import SimpleNamespace
 from dotenv import load_dotenv
 
 # Load environment variables from .env file (for local dev)
@@ -23,25 +19,152 @@ load_dotenv()
 
 # Redis / Vercel KV Configuration
 KV_URL = os.environ.get("KV_URL") or os.environ.get("REDIS_URL")
-redis_client = None
 
-if KV_URL:
-    try:
-        redis_client = redis.from_url(KV_URL)
-        redis_client.ping()
-        print("Connected to Vercel KV (Redis)")
-    except Exception as e:
-        print(f"Failed to connect to Redis: {e}")
-        redis_client = None
+class LazyRedis:
+    """
+    Redis client connected on first use instead of at import (cold starts).
+    Falsy when KV_URL is unset or the connection failed, so `if redis_client:` works as before.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+        self._failed = not url
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._client is None and not self._failed:
+            with self._lock:
+                if self._client is None and not self._failed:
+                    try:
+                        import redis
+                        client = redis.from_url(self.url)
+                        client.ping()
+                        print("Connected to Vercel KV (Redis)")
+                        self._client = client
+                    except Exception as e:
+                        print(f"Failed to connect to Redis: {e}")
+                        self._failed = True
+        return self._client
+
+    def __bool__(self):
+        return self._connect() is not None
+
+    def __getattr__(self, name):
+        client = self._connect()
+        if client is None:
+            raise AttributeError(f"Redis unavailable ({name})")
+        return getattr(client, name)
+
+redis_client = LazyRedis(KV_URL)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
 
-from ai_classifier import analyze_with_groq
+from ai_classifier import analyze_with_groq, analyze_batch_with_groq, is_ai_failure, GROQ_BATCH_MAX_ITEMS
+from batch_engine import iter_batch, speculate, Deadline, API_GOUV_LIMITER, DDG_LIMITER, GROQ_LIMITER
+from result_cache import ResultCache
+from jobs import JOB_EXTERNAL_WORKER, JobManager, create_store
+from ingest import iter_upload_rows, take_upload
+from exporter import iter_export, FORMATS as EXPORT_FORMATS
+from matchers import NgramIndex, name_signature
+from config_registry import ConfigRegistry
+from ranking import rank_candidates
+from domain_index import DomainIndex, email_domain, is_personal_domain, registrable_domain, sectors_from_corrections
+import http_client
+import metrics
+import reference_data
+
+API_GOUV_SEARCH_URL = "https://recherche-entreprises.api.gouv.fr/search"
+
+# Optional offline SIRENE base (see sirene_local.py). SIRENE_MODE: "first" (local, then API) or "only"
+import sirene_local
+SIRENE_INDEX = sirene_local.load_index(os.environ.get("SIRENE_DB_PATH", "sirene.db"))
+SIRENE_MODE = os.environ.get("SIRENE_MODE", "first")
+
+# --- Staged Resolver: latency budget per stage and per row (seconds) ---
+# A row never waits longer than ROW_DEADLINE; a stage cut short yields the best result so far.
+STAGE_BUDGET_API = float(os.environ.get("STAGE_BUDGET_API", "6"))
+STAGE_BUDGET_WEB = float(os.environ.get("STAGE_BUDGET_WEB", "6"))
+STAGE_BUDGET_AI = float(os.environ.get("STAGE_BUDGET_AI", "8"))
+ROW_DEADLINE = float(os.environ.get("ROW_DEADLINE", "15"))
+
+# Inputs the French registry usually misses: the web search starts in parallel with the API
+FOREIGN_COMPANY_PATTERN = re.compile(r'\b(inc|llc|ltd|limited|plc|gmbh|corp|corporation|ag|bv|nv|spa|srl|pty|oy|ab)\b\.?$', re.IGNORECASE)
+
+# Classification results cache (LRU front + Redis back)
+RESULT_CACHE = ResultCache(redis_client)
+
+# --- Semantic Cache (in front of the AI fallback) ---
+# Names already classified (corrections, overrides, past AI answers), searched by n-gram similarity:
+# "Groupe X" / "X SAS" / "X France" reuse X's sector instead of a new Groq call.
+SEMANTIC_INDEX = NgramIndex()
+SEMANTIC_THRESHOLD = float(os.environ.get("SEMANTIC_THRESHOLD", "0.8"))
+SEMANTIC_AI_KEY = "semantic:ai"
+
+# --- Fuzzy Name Index (typos on corrections / overrides, before any network call) ---
+# Character bigrams: one wrong letter in a short name still scores high ("CARREFOURR" -> CARREFOUR).
+# The override index is compiled with the reference tables (reference_data.ReferenceData.override_index).
+FUZZY_THRESHOLD = float(os.environ.get("FUZZY_THRESHOLD", "0.85"))
+FUZZY_MIN_LENGTH = 5
+CORRECTION_INDEX = NgramIndex(n=2)  # name -> USER_CORRECTIONS key
+
+def fuzzy_lookup(index, name):
+    # Very short names (acronyms) are too ambiguous to be matched approximately
+    if len(name_signature(name).replace(" ", "")) < FUZZY_MIN_LENGTH:
+        return None
+    hit = index.search(name, FUZZY_THRESHOLD)
+    return hit[0] if hit else None
+
+# --- Email Domain Index (before any network call) ---
+# Registrable domain -> company resolved by the API, and -> sector from user corrections
+# keyed by address ("DLV@BNPPARIBAS.COM") or domain ("@BNPPARIBAS.COM").
+DOMAIN_INDEX = DomainIndex(redis_client)
+CORRECTION_DOMAINS = {}
+
+def input_domain(raw_input):
+    ref = reference_data.get()
+    return email_domain(clean_input(raw_input), ref.public_suffixes, ref.personal_email_domains, ref.personal_email_brands)
+
+def index_correction_domains():
+    global CORRECTION_DOMAINS
+    CORRECTION_DOMAINS = sectors_from_corrections(USER_CORRECTIONS, reference_data.get().public_suffixes)
 
 # --- Configuration ---
 CORRECTIONS_FILE = "corrections.json"
+CORRECTIONS_VERSION_KEY = "corrections:version"
 USER_CORRECTIONS = {}
+# Last seen version of the corrections table: Redis counter, or file mtime in local mode
+CORRECTIONS_VERSION = None
+
+def get_corrections_version():
+    if redis_client:
+        try:
+            return ("redis", int(redis_client.get(CORRECTIONS_VERSION_KEY) or 0))
+        except Exception as e:
+            print(f"Redis Version Error: {e}")
+    try:
+        return ("file", os.path.getmtime(CORRECTIONS_FILE))
+    except OSError:
+        return ("file", None)
+
+def refresh_corrections():
+    """
+    Hot-path check: reloads USER_CORRECTIONS only when another writer bumped the version.
+    Costs a single GET instead of a full HGETALL / JSON parse per classification.
+    """
+    global CORRECTIONS_VERSION
+    version = get_corrections_version()
+    if version != CORRECTIONS_VERSION:
+        load_corrections()
+        CORRECTIONS_VERSION = version
+        for name, sector in USER_CORRECTIONS.items():
+            SEMANTIC_INDEX.add(name, sector)
+            CORRECTION_INDEX.add(name, name)
+        index_correction_domains()
+        # Another process changed corrections: locally cached results / domains may be stale
+        RESULT_CACHE.clear_local()
+        DOMAIN_INDEX.clear_local()
 
 def load_corrections():
     global USER_CORRECTIONS
@@ -71,15 +194,32 @@ def normalize_key(name):
     return name.upper().strip()
 
 def save_correction(name, sector):
-    global USER_CORRECTIONS
+    global USER_CORRECTIONS, CORRECTIONS_VERSION
+    # The whole table is rewritten below: it must be loaded first
+    ensure_state()
     # Normalize key: uppercase without spaces/special chars for robust matching
     key = normalize_key(name)
-    USER_CORRECTIONS[key] = sector
+    # Copy-on-write: batch threads iterate the published dict (refresh_corrections) without a lock
+    USER_CORRECTIONS = {**USER_CORRECTIONS, key: sector}
+    SEMANTIC_INDEX.add(key, sector)
+    CORRECTION_INDEX.add(key, key)
+    if "@" in key:
+        index_correction_domains()
+        # The company learned for this domain may be the one being corrected
+        DOMAIN_INDEX.forget(registrable_domain(key.rpartition("@")[2], reference_data.get().public_suffixes))
+    # Cached classification for this name is now stale, and so may be local rows that borrowed
+    # a correction through a fuzzy / domain / similar-name match (never stored in Redis)
+    RESULT_CACHE.invalidate(key)
+    RESULT_CACHE.clear_local()
     
-    # 1. Save to Redis
+    # 1. Save to Redis (write + version bump in one round-trip so other workers reload)
+    saved_version = None
     if redis_client:
         try:
-            redis_client.hset("corrections", key, sector)
+            pipe = redis_client.pipeline()
+            pipe.hset("corrections", key, sector)
+            pipe.incr(CORRECTIONS_VERSION_KEY)
+            saved_version = ("redis", int(pipe.execute()[1]))
         except Exception as e:
             print(f"Redis Save Error: {e}")
             
@@ -90,364 +230,86 @@ def save_correction(name, sector):
     except Exception as e:
         print(f"Error saving correction: {e}")
 
-# Load on startup
-load_corrections()
+    # Our own write must not trigger a full reload on the next row, but only if nobody else
+    # wrote in between (INCR exactly +1): otherwise stay stale so refresh_corrections reloads
+    if saved_version:
+        if CORRECTIONS_VERSION == ("redis", saved_version[1] - 1):
+            CORRECTIONS_VERSION = saved_version
+    elif not redis_client:
+        CORRECTIONS_VERSION = get_corrections_version()
 
-# --- Custom Sectors Configuration ---
-CUSTOM_SECTORS_FILE = "custom_sectors.json"
-CUSTOM_SECTORS = []
+# --- Reference Tables ---
+# Regions, SECTOR_CONFIG (keywords / NAF prefixes), headcount brackets and GLOBAL_OVERRIDES
+# live in data/reference_data.json, loaded and compiled on first use by reference_data.get().
 
-def load_custom_sectors():
-    global CUSTOM_SECTORS
-    
-    # 1. Try Redis
+# --- Competitor Watchlist (Keyrus & Market) ---
+# Default list (Keyrus itself is not a competitor). The live watchlist is editable through
+# /api/competitors and shared with the custom sectors below (Redis, then competitors.json).
+DEFAULT_COMPETITORS = [
+    "ACCENTURE", "CAPGEMINI", "DELOITTE", "PWC", "EY", "KPMG",
+    "SOPRA STERIA", "CGI", "ATOS", "WAVESTONE", "INETUM",
+    "BUSINESS & DECISION", "ARTEFACT", "CONVERTEO", "JEMS",
+    "MICROPOLE", "VISEO", "UMANIS", "DEVOTEAM", "TOLUNA",
+    "BVA", "IPSOS", "KANTAR", "MCKINSEY",
+    "BAIN", "BCG", "BOSTON CONSULTING GROUP",
+]
+
+# --- Shared Configuration (custom sectors + competitor watchlist) ---
+# Versioned snapshot shared by all workers (config_registry): edits made on one worker are
+# picked up by the others within CONFIG_POLL_SECONDS. Readers use CONFIG.current.
+def on_config_change(snapshot):
+    # Sectors / watchlist / reference tables changed: locally cached results may be stale.
+    # The Redis tier only moves with the reference tables: IsCompetitor is recomputed on every
+    # hit, and rows of a deleted custom sector are dropped by delete_sector.
+    RESULT_CACHE.set_generation(reference_data.get().version)
+
+def cache_result(key, result, shared=True):
+    # Rows classified into a custom sector are tagged with it (delete_sector drops them)
+    sector = result.get("Secteur")
+    RESULT_CACHE.set(key, result, shared, tag=sector if sector in CONFIG.current.custom_sectors else None)
+
+CONFIG = ConfigRegistry(redis_client, defaults={"competitors": DEFAULT_COMPETITORS}, on_change=on_config_change)
+
+# Holdings (7010Z) / financial holdings (6420Z): ranked below the operating company
+# of the same name (ranking.rank_candidates)
+NAF_BLACKLIST = ["7010Z", "6420Z"]
+
+def load_semantic_index():
+    """Overrides and past AI answers; user corrections (already indexed) keep precedence."""
+    for name, override in reference_data.get().global_overrides.items():
+        SEMANTIC_INDEX.add(name, override["Secteur"], replace=False)
     if redis_client:
         try:
-            # Storing as a single JSON string for simplicity (or could be a Redis Set)
-            data = redis_client.get("custom_sectors")
-            if data:
-                CUSTOM_SECTORS = json.loads(data)
-                return
+            for name, sector in redis_client.hgetall(SEMANTIC_AI_KEY).items():
+                SEMANTIC_INDEX.add(name.decode('utf-8'), sector.decode('utf-8'), replace=False)
         except Exception as e:
-             print(f"Redis Custom Sectors Load Error: {e}")
-             
-    # 2. Fallback Local
-    if os.path.exists(CUSTOM_SECTORS_FILE):
-        try:
-            with open(CUSTOM_SECTORS_FILE, 'r', encoding='utf-8') as f:
-                CUSTOM_SECTORS = json.load(f)
-        except:
-            CUSTOM_SECTORS = []
+            print(f"Redis Semantic Load Error: {e}")
 
-def save_custom_sectors():
-    
-    # 1. Redis
+def remember_ai_answer(name, sector):
+    SEMANTIC_INDEX.add(name, sector, replace=False)
     if redis_client:
         try:
-            redis_client.set("custom_sectors", json.dumps(CUSTOM_SECTORS))
+            redis_client.hset(SEMANTIC_AI_KEY, normalize_key(name), sector)
         except Exception as e:
-             print(f"Redis Custom Sectors Save Error: {e}")
-
-    # 2. Local
-    try:
-        with open(CUSTOM_SECTORS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(CUSTOM_SECTORS, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Error saving custom sectors: {e}")
-
-load_custom_sectors()
-
-# --- Comprehensive Region Mapping (The Trap Anti-Fail) ---
-# --- Comprehensive Region Mapping (The Trap Anti-Fail) ---
-DEPT_TO_REGION = {
-    "01": "Auvergne-Rhône-Alpes", "02": "Hauts-de-France", "03": "Auvergne-Rhône-Alpes", "04": "Provence-Alpes-Côte d'Azur", "05": "Provence-Alpes-Côte d'Azur",
-    "06": "Provence-Alpes-Côte d'Azur", "07": "Auvergne-Rhône-Alpes", "08": "Grand Est", "09": "Occitanie", "10": "Grand Est",
-    "11": "Occitanie", "12": "Occitanie", "13": "Provence-Alpes-Côte d'Azur", "14": "Normandie", "15": "Auvergne-Rhône-Alpes",
-    "16": "Nouvelle-Aquitaine", "17": "Nouvelle-Aquitaine", "18": "Centre-Val de Loire", "19": "Nouvelle-Aquitaine", "21": "Bourgogne-Franche-Comté",
-    "22": "Bretagne", "23": "Nouvelle-Aquitaine", "24": "Nouvelle-Aquitaine", "25": "Bourgogne-Franche-Comté", "26": "Auvergne-Rhône-Alpes",
-    "27": "Normandie", "28": "Centre-Val de Loire", "29": "Bretagne", "2A": "Corse", "2B": "Corse",
-    "30": "Occitanie", "31": "Occitanie", "32": "Occitanie", "33": "Nouvelle-Aquitaine", "34": "Occitanie",
-    "35": "Bretagne", "36": "Centre-Val de Loire", "37": "Centre-Val de Loire", "38": "Auvergne-Rhône-Alpes", "39": "Bourgogne-Franche-Comté",
-    "40": "Nouvelle-Aquitaine", "41": "Centre-Val de Loire", "42": "Auvergne-Rhône-Alpes", "43": "Auvergne-Rhône-Alpes", "44": "Pays de la Loire",
-    "45": "Centre-Val de Loire", "46": "Occitanie", "47": "Nouvelle-Aquitaine", "48": "Occitanie", "49": "Pays de la Loire",
-    "50": "Normandie", "51": "Grand Est", "52": "Grand Est", "53": "Pays de la Loire", "54": "Grand Est",
-    "55": "Grand Est", "56": "Bretagne", "57": "Grand Est", "58": "Bourgogne-Franche-Comté", "59": "Hauts-de-France",
-    "60": "Hauts-de-France", "61": "Normandie", "62": "Hauts-de-France", "63": "Auvergne-Rhône-Alpes", "64": "Nouvelle-Aquitaine",
-    "65": "Occitanie", "66": "Occitanie", "67": "Grand Est", "68": "Grand Est", "69": "Auvergne-Rhône-Alpes",
-    "70": "Bourgogne-Franche-Comté", "71": "Bourgogne-Franche-Comté", "72": "Pays de la Loire", "73": "Auvergne-Rhône-Alpes", "74": "Auvergne-Rhône-Alpes",
-    "75": "Île-de-France", "76": "Normandie", "77": "Île-de-France", "78": "Île-de-France", "79": "Nouvelle-Aquitaine",
-    "80": "Hauts-de-France", "81": "Occitanie", "82": "Occitanie", "83": "Provence-Alpes-Côte d'Azur", "84": "Provence-Alpes-Côte d'Azur",
-    "85": "Pays de la Loire", "86": "Nouvelle-Aquitaine", "87": "Nouvelle-Aquitaine", "88": "Grand Est", "89": "Bourgogne-Franche-Comté",
-    "90": "Bourgogne-Franche-Comté", "91": "Île-de-France", "92": "Île-de-France", "93": "Île-de-France", "94": "Île-de-France",
-    "95": "Île-de-France", "971": "Guadeloupe", "972": "Martinique", "973": "Guyane", "974": "La Réunion", "976": "Mayotte"
-}
-
-SECTOR_CONFIG = {
-    "Agriculture / Livestock / Seafood": {
-        "naf_prefixes": ["01", "02", "03"],
-        "keywords": ["agriculture", "élevage", "pêche", "agricole", "ferme", "bio", "tracteur", "champs", "vigne", "viticulture", "horticulture", "maraichage", "bétail", "aquaculture", "farming", "livestock", "seafood", "crops", "agri", "agro", "vignoble", "éleveur", "céréales", "semences", "fisheries"]
-    },
-    "Banking": {
-        "naf_prefixes": ["641"],
-        "keywords": ["banque", "crédit", "bancaire", "compte", "livret", "cb", "bank", "banking", "loan", "credit", "bnp", "société générale", "crédit agricole", "bpce", "lender", "mortgage", "prêt", "emprunt", "financement", "épargne"]
-    },
-    "Chemicals": {
-        "naf_prefixes": ["20"],
-        "keywords": ["chimie", "laboratoire", "molécules", "réactif", "polymère", "plastique", "chimique", "petrochemical", "chemicals", "chemistry", "lab", "solvay", "arkema", "air liquide", "gas", "gaz", "azote", "hydrogène", "composites", "resins", "paint", "peinture", "coatings"]
-    },
-    "Communication / Media & Entertainment / Telecom": {
-        "naf_prefixes": ["59", "60", "61", "63"],
-        "keywords": ["télécom", "média", "publicité", "fibre", "internet", "presse", "journal", "tv", "radio", "marketing", "agence", "communication", "entertainment", "telecom", "broadcasting", "advertising", "media", "orange", "sfr", "bouygues", "free", "publicis", "havas", "digital agency", "rédaction", "news", "contenu", "publishing", "édition", "production audiovisuelle", "streaming"]
-    },
-    "Construction": {
-        "naf_prefixes": ["41", "42", "43"],
-        "keywords": ["btp", "construction", "bâtiment", "génie civil", "infrastructure", "travaux", "architecture", "maçonnerie", "électicité", "plomberie", "architect", "builder", "contractor", "civil", "renovation", "vinci", "eiffage", "bouygues construction", "rénovation", "agencement", "menuiserie", "charpente", "promoteur", "immobilier neuf", "engineering", "ingénierie bâtiment", "hvac", "étanchéité"]
-    },
-    "Consulting / IT Services": {
-        "naf_prefixes": ["62", "631", "582", "702", "692", "7112", "712", "732", "74"],
-        "keywords": ["conseil", "consulting", "esn", "stratégie", "audit", "expertise", "ingénierie", "rub", "management", "digital", "transformation", "it services", "système d'information", "data", "advisory", "capgemini", "deloitte", "kpmg", "pwc", "mckinsey", "bain", "bcg", "accenture", "sogeti", "sopra", "wavestone", "alteca", "umanis", "devops", "cloud computing", "cybersécurité", "business intelligence", "big data", "agile", "scrum", "moa", "moe", "change management"]
-    },
-    "CPG (Consumer Packaged Goods)": {
-        "naf_prefixes": ["204"],
-        "keywords": ["fmcg", "biens de consommation", "hygiène", "produits ménagers", "cosmétique", "beauté", "parfum", "shampoing", "savon", "lessive", "cpg", "consumer goods", "l'oréal", "procter", "gamble", "unilever", "danone", "nestlé", "henkel", "persil", "dash", "ariel", "schwarzkopf", "nivea", "dove", "maquillage", "makeup", "skincare", "soin", "personal care", "toiletries"]
-    },
-    "Education": {
-        "naf_prefixes": ["85"],
-        "keywords": ["éducation", "formation", "école", "université", "training", "learning", "elearning", "edtech", "campus", "formation continue", "school", "university", "academy", "college", "enseignement", "pédagogie", "cours", "tutoring", "soutien scolaire", "mba", "master", "licence", "certification"]
-    },
-    "Energy / Utilities": {
-        "naf_prefixes": ["35", "36", "37", "38", "39"],
-        "keywords": ["énergie", "électricité", "gaz", "eau", "déchets", "environnement", "recyclage", "solaire", "éolien", "nucléaire", "oil", "petrol", "renewables", "green", "carbon", "hydrogen", "edf", "engie", "total", "veolia", "suez", "photovoltaïque", "biomasse", "hydro", "grid", "réseau électrique", "assainissement", "waste management", "energy", "batteries", "charging"]
-    },
-    "Finance / Real Estate": {
-        "naf_prefixes": ["64", "66", "68"],
-        "keywords": ["finance", "financial", "services financiers", "immobilier", "investissement", "gestion d'actifs", "courtier", "syndic", "promoteur", "real estate", "realty", "property", "logement", "immo", "wealth", "fintech", "payment", "trading", "crypto", "blockchain", "vc", "private equity", "fund", "foncia", "nexity", "asset management", "patrimoine", "défiscalisation", "location", "vente immobilière", "agency", "investor", "capital", "holding", "reit"]
-    },
-    "Food / Beverages": {
-        "naf_prefixes": ["10", "11"],
-        "keywords": ["agroalimentaire", "aliments", "boissons", "food", "beverage", "vin", "spiritueux", "bière", "champagne", "nutrition", "snack", "dairy", "laitier", "viande", "boulangerie", "traiteur", "épicerie", "confiserie", "chocolat", "surgelés", "frozen", "drinks", "juice", "jus", "distillery", "brewery", "winery", "bio food", "organic", "restaurant supply"]
-    },
-    "Healthcare / Medical Services": {
-        "naf_prefixes": ["86", "87", "88"],
-        "keywords": ["santé", "clinique", "hôpital", "soins", "médecin", "infirmier", "ehpad", "médical", "chirurgie", "patient", "healthcare", "medical", "hospital", "clinic", "care", "doctor", "diagnostic", "radiologie", "dentaire", "kine", "ramsay", "elsan", "korian", "orpea", "nursing", "home care", "aide à domicile", "analyse", "labo", "biologie", "medtech", "e-health"]
-    },
-    "Hotels / Restaurants": {
-        "naf_prefixes": ["55", "56"],
-        "keywords": ["hôtel", "restaurant", "tourisme", "hébergement", "camping", "voyage", "bar", "café", "brasserie", "cuisine", "hotel", "hospitality", "tourism", "restaurant", "catering", "accor", "club med", "sodexo", "elior", "travel", "resort", "vacances", "booking", "chef", "gastronomie", "food service", "fast food"]
-    },
-    "Insurance / Mutual Health Insurance": {
-        "naf_prefixes": ["65"],
-        "keywords": ["assurance", "mutuelle", "courtage", "assureur", "prévoyance", "risques", "insurance", "underwriting", "axa", "allianz", "generali", "maif", "macif", "groupama", "malakoff", "ag2r", "harmonie", "protection sociale", "sinistre", "broker", "reinsurance", "réassurance", "insurtech"]
-    },
-    "Luxury": {
-        "naf_prefixes": ["141", "142", "151", "152"],
-        "keywords": ["luxe", "prestige", "haute couture", "joaillerie", "maroquinerie", "palace", "luxury", "fashion", "jewelry", "premium", "high-end", "mode", "vêtement", "chaussures", "shoes", "wear", "apparel", "lvmh", "kering", "hermès", "chanel", "dior", "vuitton", "gucci", "prada", "rolex", "cartier", "bijoux", "diamant", "montres", "watches", "perfumery"]
-    },
-    "Manufacturing / Industry": {
-        "naf_prefixes": ["13", "14", "15", "16", "17", "22", "23", "24", "25", "26", "27", "28", "29", "30", "31", "32", "33"],
-        "keywords": ["industrie", "usine", "fabrication", "mécanique", "métallurgie", "plasturgie", "assemblage", "production", "machine", "outil", "industriel", "manufacturing", "industry", "factory", "plant", "metal", "machinery", "automotive", "aéronautique", "aerospace", "defense", "textile", "imprimerie", "packaging", "saint-gobain", "schneider", "legrand", "michelin", "stellantis", "renault", "airbus", "thales", "safran", "dassault", "alstom", "composants", "robotics", "automation", "electronics assembly"]
-    },
-    "Not For Profit": {
-        "naf_prefixes": ["94", "91"],
-        "keywords": ["association", "fondation", "ong", "non-profit", "charity", "bénévole", "social", "humanitaire", "syndicat", "union", "club", "croix rouge", "secours populaire", "médecins sans frontières", "unicef", "caritas", "aide", "solidarité", "non lucratif", "philanthropy"]
-    },
-    "Pharmaceutics": {
-        "naf_prefixes": ["21"],
-        "keywords": ["pharmacie", "médicament", "biotech", "laboratoire", "vaccin", "recherche", "molécule", "thérapie", "pharmaceutical", "pharma", "drug", "biotechnology", "medicine", "lifescience", "sanofi", "servier", "pfizer", "moderna", "astrazeneca", "bayer", "novartis", "roche", "lilly", "clinical trials", "essais cliniques", "cro"]
-    },
-    "Public administration & government": {
-        "naf_prefixes": ["84"],
-        "keywords": ["mairie", "préfecture", "ministère", "collectivité", "public", "etat", "government", "administration", "caisse", "caf", "urssaf", "pole emploi", "france travail", "ambassade", "consulat", "département", "région", "agglomération", "commune", "service public"]
-    },
-    "Retail": {
-        "naf_prefixes": ["45", "46", "47"],
-        "keywords": ["commerce", "vente", "magasin", "boutique", "supermarché", "distribution", "retail", "store", "shop", "e-commerce", "marketplace", "grossiste", "grand magasin", "shopping", "mall", "outlet", "franchise", "carrefour", "auchan", "leclerc", "decathlon", "fnac", "darty", "amazon", "cdiscount", "bricolage", "jardinage", "ameublement", "fashion retail", "grocery", "point de vente", "wholesaler"]
-    },
-    "HR / Recruitment / Interim": {
-        "naf_prefixes": ["78"],
-        "keywords": ["intérim", "recrutement", "rh", "ressources humaines", "agence d'emploi", "staffing", "recruitment", "chasseur de tête", "talent", "manpower", "adecco", "randstad", "crit", "synergie", "proman", "michael page", "hays", "robert half", "headhunting", "jobs", "emplois", "carrière", "paye", "payroll"]
-    },
-    "Tech / Software": {
-        "naf_prefixes": ["582", "6201", "6312", "262"],
-        "keywords": ["logiciel", "saas", "tech", "software", "application", "ia", "intelligence artificielle", "cloud", "développement", "web", "app", "cybersecurity", "platform", "technology", "developer", "electronics", "hardware", "computer", "start-up", "google", "microsoft", "apple", "meta", "aws", "salesforce", "sap", "oracle", "it", "informatique", "data science", "machine learning", "coding", "programmation", "algorithme", "api", "fintech", "blockchain", "iot", "data center"]
-    },
-    "Transportation, Logistics & Storage": {
-        "naf_prefixes": ["49", "50", "51", "52", "53"],
-        "keywords": ["transport", "logistique", "fret", "livraison", "messagerie", "entrepôt", "supply chain", "shipping", "transit", "colis", "airline", "aérien", "avion", "bateau", "compagnie aérienne", "rail", "ferroviaire", "maritime", "port", "sncf", "air france", "maersk", "cma cgm", "dhl", "fedex", "ups", "geodis", "bolloré", "xpo", "container", "cargo", "logistics", "warehouse", "freight"]
-    }
-}
-
-# --- Competitor Watchlist (Keyrus & Market) ---
-COMPETITORS = {
-    "ACCENTURE", "CAPGEMINI", "DELOITTE", "PWC", "EY", "KPMG", 
-    "SOPRA STERIA", "CGI", "ATOS", "WAVESTONE", "INETUM", 
-    "BUSINESS & DECISION", "ARTEFACT", "CONVERTEO", "JEMS", 
-    "MICROPOLE", "VISEO", "UMANIS", "DEVOTEAM", "TOLUNA", 
-    "BVA", "IPSOS", "KANTAR", "MCKINSEY", 
-    "BAIN", "BCG", "BOSTON CONSULTING GROUP", "KEYRUS" # Keeping Keyrus in list but fixing logic? User said "Disney est Keyrus sont toujours des concurrent". 
-    # WAIT. User said "Disney est Keyrus sont toujours des concurrent" -> "Disney AND Keyrus remain competitors". 
-    # If the user meant "Why are they competitors?", then I should remove them or fix the matching.
-    # If the user meant "They ARE competitors" (assertion), then I should default to keeping them if valid, but the user likely reported a bug.
-    # The previous turn analysis: "implies an issue... likely that they are incorrectly identified".
-    # And my plan said: "Remove KEYRUS from the COMPETITORS list".
-    # So I will remove KEYRUS. Line 192 has Keyrus.
-    "BVA", "IPSOS", "KANTAR", "MCKINSEY", 
-}
-
-NAF_BLACKLIST = ["7010Z", "6420Z"]
-
-# ... (We need to jump to the logic part, but I can't do non-contiguous edits in one block)
-# I will do the list revert first, then the logic change in a second step or if the tool supports it... 
-# Wait, the prompt says "Revert... Then modify". 
-# replace_file_content is for SINGLE CONTIGUOUS BLOCK. 
-# I cannot edit line 197 and line 621 in one go.
-# I will use multi_replace.
-
-# --- Mappings ---
-TRANCHE_EFFECTIFS = {
-    "NN": "Non renseigné",
-    "00": "0 salarié",
-    "01": "1 ou 2 salariés",
-    "02": "3 à 5 salariés",
-    "03": "6 à 9 salariés",
-    "11": "10 à 19 salariés",
-    "12": "20 à 49 salariés",
-    "21": "50 à 99 salariés",
-    "22": "100 à 199 salariés",
-    "31": "200 à 249 salariés",
-    "32": "250 à 499 salariés",
-    "41": "500 à 999 salariés",
-    "42": "1 000 à 1 999 salariés",
-    "51": "2 000 à 4 999 salariés",
-    "52": "5 000 à 9 999 salariés",
-    "53": "10 000 salariés et plus"
-}
-
-# --- GLOBAL STATIC OVERRIDES (Safety Net) ---
-GLOBAL_OVERRIDES = {
-    "APPLE": {"Secteur": "Tech / Software", "Nom Officiel": "APPLE INC.", "Adresse": "Cupertino, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "TESLA": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "TESLA INC.", "Adresse": "Austin, TX (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "GOOGLE": {"Secteur": "Tech / Software", "Nom Officiel": "ALPHABET INC.", "Adresse": "Mountain View, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "MICROSOFT": {"Secteur": "Tech / Software", "Nom Officiel": "MICROSOFT CORP", "Adresse": "Redmond, WA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "AMAZON": {"Secteur": "Tech / Software", "Nom Officiel": "AMAZON.COM INC", "Adresse": "Seattle, WA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "META": {"Secteur": "Tech / Software", "Nom Officiel": "META PLATFORMS", "Adresse": "Menlo Park, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "FACEBOOK": {"Secteur": "Tech / Software", "Nom Officiel": "META PLATFORMS", "Adresse": "Menlo Park, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "LVMH": {"Secteur": "Luxury", "Nom Officiel": "LVMH MOET HENNESSY", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/775670417"},
-    "CHRISTIAN DIOR": {"Secteur": "Luxury", "Nom Officiel": "CHRISTIAN DIOR SE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "LOUIS VUITTON": {"Secteur": "Luxury", "Nom Officiel": "LOUIS VUITTON MALLETIER", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "CHRISTIAN LOUBOUTIN": {"Secteur": "Luxury", "Nom Officiel": "CHRISTIAN LOUBOUTIN", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "1 000+ salariés"},
-    "CHANEL": {"Secteur": "Luxury", "Nom Officiel": "CHANEL SAS", "Adresse": "Neuilly-sur-Seine (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "HERMES": {"Secteur": "Luxury", "Nom Officiel": "HERMES INTERNATIONAL", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "GUCCI": {"Secteur": "Luxury", "Nom Officiel": "GUCCI", "Adresse": "Florence (Italy)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "PRADA": {"Secteur": "Luxury", "Nom Officiel": "PRADA SPA", "Adresse": "Milan (Italy)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    
-    # Transport
-    "SNCF": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "SNCF", "Adresse": "Saint-Denis (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/552049447"},
-    "RATP": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "REGIE AUTONOME DES TRANSPORTS PARISIENS", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/775663438"},
-    "LA POSTE": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "LA POSTE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/356000000"},
-    "GROUPE LA POSTE": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "LA POSTE", "Adresse": "Issy-les-Moulineaux (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"}, # Keep existing entry
-    "AIR FRANCE": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "AIR FRANCE", "Adresse": "Tremblay-en-France (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/420495178"},
-
-    # Bank / Finance
-    "BNP": {"Secteur": "Banking", "Nom Officiel": "BNP PARIBAS", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/662042449"},
-    "BNP PARIBAS": {"Secteur": "Banking", "Nom Officiel": "BNP PARIBAS", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/662042449"},
-    "SOCIETE GENERALE": {"Secteur": "Banking", "Nom Officiel": "SOCIETE GENERALE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/552120222"},
-    "SNOWFLAKE": {"Nom Officiel": "SNOWFLAKE FRANCE", "Secteur": "Tech / Software", "Adresse": "Non renseigné", "Région": "Île-de-France"},
-    "ATOS": {"Nom Officiel": "ATOS SE", "Secteur": "Consulting / IT Services", "Adresse": "Bezons (France)", "Région": "Île-de-France", "Effectif": "100 000+ salariés"},
-    "CREDIT AGRICOLE": {"Secteur": "Banking", "Nom Officiel": "CREDIT AGRICOLE SA", "Adresse": "Montrouge (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/784608416"},
-
-    # Energy
-    "TOTALENERGIES": {"Secteur": "Energy / Utilities", "Nom Officiel": "TOTALENERGIES SE", "Adresse": "Courbevoie (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/542051180"},
-    "ENGIE": {"Secteur": "Energy / Utilities", "Nom Officiel": "ENGIE", "Adresse": "Courbevoie (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/542107651"},
-    "EDF": {"Secteur": "Energy / Utilities", "Nom Officiel": "ELECTRICITE DE FRANCE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/552081317"},
-    
-    # Telecom
-    "ORANGE": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "ORANGE SA", "Adresse": "Issy-les-Moulineaux (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/380129866"},
-    "SFR": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "SFR", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/343059564"},
-    "FREE": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "ILIAD (FREE)", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/421938861"},
-    "ILIAD": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "ILIAD (FREE)", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"}, # Keep existing entry
-    "BOUYGUES TELECOM": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "BOUYGUES TELECOM", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/397480936"},
-    
-    # Consulting (Added due to user feedback)
-    "CAPGEMINI": {"Secteur": "Consulting / IT Services", "Nom Officiel": "CAPGEMINI SE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/330703844"},
-    "KPMG": {"Secteur": "Consulting / IT Services", "Nom Officiel": "KPMG S.A", "Adresse": "Paris La Défense (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "DELOITTE": {"Secteur": "Consulting / IT Services", "Nom Officiel": "DELOITTE SAS", "Adresse": "Paris La Défense (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "EY": {"Secteur": "Consulting / IT Services", "Nom Officiel": "ERNST & YOUNG", "Adresse": "Paris La Défense (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "PWC": {"Secteur": "Consulting / IT Services", "Nom Officiel": "PWC FRANCE", "Adresse": "Neuilly-sur-Seine (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "ACCENTURE": {"Secteur": "Consulting / IT Services", "Nom Officiel": "ACCENTURE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    
-    # Retail / Grands Magasins
-    "GALERIES LAFAYETTE": {"Secteur": "Retail", "Nom Officiel": "GALERIES LAFAYETTE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "PRINTEMPS": {"Secteur": "Retail", "Nom Officiel": "PRINTEMPS", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-
-    # Tech / Web
-    "SPOTIFY": {"Secteur": "Tech / Software", "Nom Officiel": "SPOTIFY TECHNOLOGY", "Adresse": "Stockholm (Sweden)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "UBER": {"Secteur": "Tech / Software", "Nom Officiel": "UBER TECHNOLOGIES", "Adresse": "San Francisco, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "AIRBNB": {"Secteur": "Tech / Software", "Nom Officiel": "AIRBNB INC.", "Adresse": "San Francisco, CA (USA)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "AIR BNB": {"Secteur": "Tech / Software", "Nom Officiel": "AIRBNB INC.", "Adresse": "San Francisco, CA (USA)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "NETFLIX": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "NETFLIX INC.", "Adresse": "Los Gatos, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "NVIDIA": {"Secteur": "Tech / Software", "Nom Officiel": "NVIDIA CORP", "Adresse": "Santa Clara, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    
-    # Auto
-    "BMW": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "BMW AG", "Adresse": "Munich (Germany)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "MERCEDES": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "MERCEDES-BENZ GROUP", "Adresse": "Stuttgart (Germany)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "TOYOTA": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "TOYOTA MOTOR CORP", "Adresse": "Toyota City (Japan)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "VOLKSWAGEN": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "VOLKSWAGEN AG", "Adresse": "Wolfsburg (Germany)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    
-    # Consumer
-    "COCA COLA": {"Secteur": "Food / Beverages", "Nom Officiel": "THE COCA-COLA COMPANY", "Adresse": "Atlanta, GA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés", "Siren": None},
-    "DANONE": {"Secteur": "Food / Beverages", "Nom Officiel": "DANONE", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Siren": "552032534"},
-    "PEPSI": {"Secteur": "Food / Beverages", "Nom Officiel": "PEPSICO INC.", "Adresse": "Harrison, NY (USA)", "Région": "Monde", "Effectif": "10 000+ salariés", "Siren": None},
-    "SAMSUNG": {"Secteur": "Tech / Software", "Nom Officiel": "SAMSUNG ELECTRONICS", "Adresse": "Suwon (South Korea)", "Région": "Monde", "Effectif": "10 000+ salariés", "Siren": None},
-    "NIKE": {"Secteur": "Retail", "Nom Officiel": "NIKE INC.", "Adresse": "Beaverton, OR (USA)", "Région": "Monde", "Effectif": "10 000+ salariés", "Siren": None},
-    
-    # Smartphones / Tech Asia
-    "XIAOMI": {"Secteur": "Tech / Software", "Nom Officiel": "XIAOMI CORP", "Adresse": "Beijing (China)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "OPPO": {"Secteur": "Tech / Software", "Nom Officiel": "OPPO ELECTRONICS", "Adresse": "Dongguan (China)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "HUAWEI": {"Secteur": "Tech / Software", "Nom Officiel": "HUAWEI TECHNOLOGIES", "Adresse": "Shenzhen (China)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "ONEPLUS": {"Secteur": "Tech / Software", "Nom Officiel": "ONEPLUS TECHNOLOGY", "Adresse": "Shenzhen (China)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-
-    # Retail / Supermarkets (France & Global)
-    "CARREFOUR": {"Secteur": "Retail", "Nom Officiel": "CARREFOUR SA", "Adresse": "Massy (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/652014051"},
-    "AUCHAN": {"Secteur": "Retail", "Nom Officiel": "AUCHAN RETAIL", "Adresse": "Croix (France)", "Région": "Hauts-de-France", "Effectif": "10 000+ salariés"},
-    "LECLERC": {"Secteur": "Retail", "Nom Officiel": "E.LECLERC", "Adresse": "Ivry-sur-Seine (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "INTERMARCHE": {"Secteur": "Retail", "Nom Officiel": "ITM ENTREPRISES", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "INTERMARCHÉ": {"Secteur": "Retail", "Nom Officiel": "ITM ENTREPRISES", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "LIDL": {"Secteur": "Retail", "Nom Officiel": "LIDL STIFTUNG", "Adresse": "Neckarsulm (Germany)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "ALDI": {"Secteur": "Retail", "Nom Officiel": "ALDI EINKAUF", "Adresse": "Essen (Germany)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "NETTO": {"Secteur": "Retail", "Nom Officiel": "NETTO MARKEN-DISCOUNT", "Adresse": "Germany", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "ACTION": {"Secteur": "Retail", "Nom Officiel": "ACTION B.V.", "Adresse": "Zwaagdijk (Netherlands)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-
-    # Fixes from User Feedback
-    "DISNEY": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "THE WALT DISNEY COMPANY", "Adresse": "Burbank, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "DECATHLON": {"Secteur": "Retail", "Nom Officiel": "DECATHLON SE", "Adresse": "Villeneuve-d'Ascq (France)", "Région": "Hauts-de-France", "Effectif": "10 000+ salariés", "Lien": "https://annuaire-entreprises.data.gouv.fr/entreprise/306138900"},
-    "LONGCHAMP": {"Secteur": "Luxury", "Nom Officiel": "LONGCHAMP SAS", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "1 000+ salariés"},
-    "MONOPRIX": {"Secteur": "Retail", "Nom Officiel": "MONOPRIX", "Adresse": "Clichy (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "PERNOD RICARD": {"Secteur": "Food / Beverages", "Nom Officiel": "PERNOD RICARD", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "PFIZER": {"Secteur": "Pharmaceutics", "Nom Officiel": "PFIZER INC.", "Adresse": "New York, NY (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "LA POSTE": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "LA POSTE", "Adresse": "Issy-les-Moulineaux (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "GROUPE LA POSTE": {"Secteur": "Transportation, Logistics & Storage", "Nom Officiel": "LA POSTE", "Adresse": "Issy-les-Moulineaux (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "TDF": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "TDF", "Adresse": "Montrouge (France)", "Région": "Île-de-France", "Effectif": "1 000+ salariés"},
-    "SYMBIO": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "SYMBIO", "Adresse": "Vénissieux (France)", "Région": "Auvergne-Rhône-Alpes", "Effectif": "500+ salariés"},
-    "APRIL": {"Secteur": "Insurance / Mutual Health Insurance", "Nom Officiel": "APRIL", "Adresse": "Lyon (France)", "Région": "Auvergne-Rhône-Alpes", "Effectif": "1 000+ salariés"},
-    "SAFRAN": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "SAFRAN SA", "Adresse": "Paris (France)", "Région": "Île-de-France", "Effectif": "10 000+ salariés"},
-    "VISIATIV": {"Secteur": "Tech / Software", "Nom Officiel": "VISIATIV", "Adresse": "Charbonnières-les-Bains (France)", "Région": "Auvergne-Rhône-Alpes", "Effectif": "1 000+ salariés"},
-    "AMOOBI": {"Secteur": "Tech / Software", "Nom Officiel": "AMOOBI", "Adresse": "N/A (International)", "Région": "Monde", "Effectif": "10-50 salariés"},
-    "SAFRAN AERO BOOSTERS": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "SAFRAN AERO BOOSTERS", "Adresse": "Herstal (Belgium)", "Région": "Monde", "Effectif": "1 000+ salariés"},
-    "SAFRAN AERO BOSOTERS": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "SAFRAN AERO BOOSTERS", "Adresse": "Herstal (Belgium)", "Région": "Monde", "Effectif": "1 000+ salariés"},
-    "SERFIGROUP": {"Secteur": "Retail", "Nom Officiel": "SERFI INTERNATIONAL", "Adresse": "Nice (France)", "Région": "Provence-Alpes-Côte d'Azur", "Effectif": "20-49 salariés"},
-    "SERFI GROUP": {"Secteur": "Retail", "Nom Officiel": "SERFI INTERNATIONAL", "Adresse": "Nice (France)", "Région": "Provence-Alpes-Côte d'Azur", "Effectif": "20-49 salariés"},
-    "SERFI INTERNATIONAL": {"Secteur": "Retail", "Nom Officiel": "SERFI INTERNATIONAL", "Adresse": "Nice (France)", "Région": "Provence-Alpes-Côte d'Azur", "Effectif": "20-49 salariés"},
-    
-    # International Tech / Electronics (Added for safety)
-    "ADOBE": {"Secteur": "Tech / Software", "Nom Officiel": "ADOBE INC.", "Adresse": "San Jose, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "NINTENDO": {"Secteur": "Communication / Media & Entertainment / Telecom", "Nom Officiel": "NINTENDO CO., LTD", "Adresse": "Kyoto (Japan)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "PHILIPS": {"Secteur": "Manufacturing / Industry", "Nom Officiel": "KONINKLIJKE PHILIPS", "Adresse": "Amsterdam (Netherlands)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    "SALESFORCE": {"Secteur": "Tech / Software", "Nom Officiel": "SALESFORCE", "Adresse": "San Francisco, CA (USA)", "Région": "Monde", "Effectif": "10 000+ salariés"},
-    
-    # Modern Tech / Remote Tools
-    "ZOOM": {"Secteur": "Tech / Software", "Nom Officiel": "ZOOM VIDEO COMMUNICATIONS", "Adresse": "San Jose, CA (USA)", "Région": "Monde", "Effectif": "5 000+ salariés"},
-    "SLACK": {"Secteur": "Tech / Software", "Nom Officiel": "SALESFORCE (SLACK)", "Adresse": "San Francisco, CA (USA)", "Région": "Monde", "Effectif": "1 000+ salariés"}
-}
-
-# Pre-compute Normalized Keys for Robust Matching
-# Maps "COCACOLA" -> "COCA COLA", "LVMH" -> "LVMH", "AIRBNB" -> "AIRBNB"
-NORMALIZED_OVERRIDES = {k.replace(" ", "").replace(".", "").replace("-", ""): k for k in GLOBAL_OVERRIDES}
-
-# Explicit Typos / Variations Mapping (Normalized -> Real Key)
-NORMALIZED_OVERRIDES["BNBPARIBAS"] = "BNP PARIBAS"
-NORMALIZED_OVERRIDES["BNB"] = "BNP PARIBAS"
-NORMALIZED_OVERRIDES["BNPPARIBAS"] = "BNP PARIBAS"
-NORMALIZED_OVERRIDES["BNP-PARIBAS"] = "BNP PARIBAS"
-NORMALIZED_OVERRIDES["FREEPRO"] = "FREE"
-NORMALIZED_OVERRIDES["GROUPAGRICA"] = "GROUPE AGRICA"
-NORMALIZED_OVERRIDES["MANOMANO"] = "COLIBRI SAS"
-NORMALIZED_OVERRIDES["COLIBRI"] = "COLIBRI SAS"
-NORMALIZED_OVERRIDES["NATIXIS-CORPORATE-INVESTMENT-BANKING"] = "NATIXIS"
-NORMALIZED_OVERRIDES["SOPRA"] = "SOPRA STERIA"
-NORMALIZED_OVERRIDES["CLUBMED"] = "CLUB MED"
-NORMALIZED_OVERRIDES["CLUB.MED"] = "CLUB MED"
-NORMALIZED_OVERRIDES["CLUB-MED"] = "CLUB MED"
+            print(f"Redis Semantic Save Error: {e}")
+
+# --- Lazy Startup State ---
+# Loaded by the first request that needs it rather than at import (Vercel cold starts)
+_STATE_LOCK = threading.Lock()
+_STATE_LOADED = False
+
+def ensure_state():
+    """Corrections, the shared configuration and the semantic index, loaded once."""
+    global _STATE_LOADED
+    if _STATE_LOADED:
+        return
+    with _STATE_LOCK:
+        if _STATE_LOADED:
+            return
+        refresh_corrections()
+        CONFIG.refresh(force=True)
+        load_semantic_index()
+        _STATE_LOADED = True
 
 def get_region_from_dept(zip_code):
     if not zip_code or len(zip_code) < 2: return "Autre"
@@ -458,24 +320,26 @@ def get_region_from_dept(zip_code):
     else:
         dept = zip_code[:2]
 
-    return DEPT_TO_REGION.get(dept, f"France ({dept})")
+    return reference_data.get().dept_to_region.get(dept, f"France ({dept})")
 
 def check_is_competitor(name):
     """
     Checks if a company name is a competitor using strict word boundaries.
     Avoids 'EY' matching inside 'DISNEY' or 'KEYRUS'.
     """
-    if not name: return False
-    upper_name = name.upper()
-    for comp in COMPETITORS:
-        # \b matches word boundary. escape(comp) handles special chars like &
-        if re.search(r'\b' + re.escape(comp) + r'\b', upper_name):
-            return True
-    return False
+    return CONFIG.current.competitors.match(name) is not None
+
+def flag_competitor(result, company_name):
+    """
+    IsCompetitor of a result row, set here only so fresh and cached rows agree (the watchlist
+    may have changed since caching): its official name or the name extracted from the input.
+    """
+    result["IsCompetitor"] = check_is_competitor(result.get("Nom Officiel")) or check_is_competitor(company_name)
+    return result
 
 # --- Helper Functions ---
 
-def extract_company_from_input(input_str):
+def clean_input(input_str):
     input_str = input_str.strip()
     
     # Pre-cleaning: Text often comes from Excel copy-paste (Tab delimited)
@@ -490,18 +354,23 @@ def extract_company_from_input(input_str):
 
     if "\n" in input_str:
         input_str = input_str.split("\n")[0]
-        
-    company = input_str.strip()
+
+    return input_str.strip()
+
+def extract_company_from_input(input_str):
+    company = clean_input(input_str)
 
     # If it's still an email, try to extract domain
     if "@" in company and not company.startswith("http"):
         try:
             domain = company.split("@")[1]
             if "." in domain:
-                candidate = domain.split(".")[0]
-                # Smart Filter: Keep Gmail/Outlook ignored
-                if candidate.lower() not in ["gmail", "outlook", "hotmail", "yahoo", "wanadoo", "icloud", "laposte"]:
-                     company = candidate
+                ref = reference_data.get()
+                # Registrable part: "mail.bnpparibas.co.uk" -> "bnpparibas.co.uk"
+                domain = registrable_domain(domain, ref.public_suffixes) or domain.lower()
+                # Smart Filter: Keep Gmail/Outlook ignored, in every country variant (gmail.fr, yahoo.co.uk)
+                if not is_personal_domain(domain, ref.personal_email_domains, ref.personal_email_brands):
+                     company = domain.split(".")[0]
         except:
             pass
     
@@ -526,31 +395,19 @@ def extract_company_from_input(input_str):
     return company.strip(), True
 
 def get_sector_from_naf(naf_code):
-    if not naf_code: return None
-    naf_clean = naf_code.replace(".", "")
-    best_sector = None
-    max_prefix_len = 0
-    for sector, config in SECTOR_CONFIG.items():
-        for prefix in config["naf_prefixes"]:
-            if naf_clean.startswith(prefix):
-                if len(prefix) > max_prefix_len:
-                    max_prefix_len = len(prefix)
-                    best_sector = sector
-    return best_sector
+    # Longest-prefix lookup, O(len(code)) (see matchers.NafIndex)
+    return reference_data.get().naf_index.lookup(naf_code)
 
 def score_text(text, weights=1.0):
-    scores = {}
-    text = text.lower()
-    for sector, config in SECTOR_CONFIG.items():
-        score = 0
-        for keyword in config["keywords"]:
-            # Valid Regex: r'\b' (Word Boundary). escaped keyword.
-            count = len(re.findall(r'\b' + re.escape(keyword) + r'\b', text))
-            score += count * weights
-        scores[sector] = score
-    return scores
-
-def analyze_web_content(company_name):
+    # Single pass over the text for all sectors (see matchers.KeywordMatcher)
+    return reference_data.get().keyword_matcher.score(text, weights)
+
+def should_speculate_web(raw_input):
+    """Email-derived names (domain part) and foreign legal forms rarely match a SIRENE denomination."""
+    return "@" in raw_input or bool(FOREIGN_COMPANY_PATTERN.search(raw_input.strip()))
+
+def analyze_web_content(company_name, budget=None, cancel=None):
+    """`cancel` (threading.Event): set when a speculative search is no longer needed."""
     try:
         search_results = []
         snippet_text = ""
@@ -562,14 +419,29 @@ def analyze_web_content(company_name):
             # Local import to prevent module-level crash if library is missing/incompatible
             from duckduckgo_search import DDGS
             query = f"{company_name} societe.com France"
-            with DDGS() as ddgs:
-                 # limit=1
-                 results = list(ddgs.text(query, region='fr-fr', max_results=1))
-                 if results:
-                      first_res = results[0]
-                      source_url = first_res.get('href', '')
-                      page_title = first_res.get('title', '')
-                      snippet_text = f"{page_title} {first_res.get('body', '')}"
+            if not DDG_LIMITER.acquire(timeout=budget, cancel=cancel):
+                if cancel and cancel.is_set():
+                    return None, "Web: annulé", 0, ""
+                return None, "Web: délai dépassé", 0, ""
+            # The API may have answered while we waited for the token
+            if cancel and cancel.is_set():
+                return None, "Web: annulé", 0, ""
+            ddg_start = time.monotonic()
+            try:
+                 with DDGS(timeout=max(int(budget), 1) if budget is not None else 10) as ddgs:
+                      # limit=1
+                      results = list(ddgs.text(query, region='fr-fr', max_results=1))
+            except Exception as e:
+                 # DuckDuckGoSearchException subclasses: RatelimitException is DDG's 429
+                 status = 429 if "ratelimit" in type(e).__name__.lower() else "error"
+                 metrics.record_upstream("duckduckgo", time.monotonic() - ddg_start, status)
+                 raise
+            metrics.record_upstream("duckduckgo", time.monotonic() - ddg_start, 200)
+            if results:
+                 first_res = results[0]
+                 source_url = first_res.get('href', '')
+                 page_title = first_res.get('title', '')
+                 snippet_text = f"{page_title} {first_res.get('body', '')}"
         except Exception as e:
             print(f"DDG Lib Error: {e}")
             
@@ -579,7 +451,8 @@ def analyze_web_content(company_name):
 
         # Score the Snippet directly
         # Fix: Use r'\b' for word boundary instead of r'\\b' (which matches literal backslash)
-        scores_snippet = score_text(snippet_text, weights=5.0)
+        with metrics.timed("scoring"):
+            scores_snippet = score_text(snippet_text, weights=5.0)
         
         final_scores = scores_snippet
             
@@ -598,15 +471,208 @@ def analyze_web_content(company_name):
         return None, f"Error (Web): {str(e)}", 0, ""
 
 
-def categorize_company_logic(raw_input):
+def search_companies(company_name, budget=None):
+    """
+    Registry lookup: local SIRENE base first (if installed), then recherche-entreprises API.
+    Returns (data, source) where data has the API shape {"results": [...]}, or (None, source).
+    `budget` (seconds) bounds the API call, retries included.
+    """
+    if SIRENE_INDEX:
+        try:
+            local_results = SIRENE_INDEX.search(company_name)
+            if local_results or SIRENE_MODE == "only":
+                return {"results": local_results}, "Officiel (SIRENE)"
+        except Exception as e:
+            print(f"SIRENE Local Error: {e}")
+
+    # Pooled session: keep-alive, timeouts, retries on 429/5xx (Retry-After honored)
+    response = http_client.get(API_GOUV_SEARCH_URL, params={"q": company_name, "per_page": 5}, limiter=API_GOUV_LIMITER, budget=budget)
+    if response.status_code == 200:
+        return response.json(), "Officiel (API)"
+    return None, "Officiel (API)"
+
+
+def pick_candidate(company_name, candidates):
+    ranked = rank_candidates(company_name, candidates, list(reference_data.get().tranche_effectifs), NAF_BLACKLIST)
+    return ranked[0][1] if ranked else None
+
+
+def mark_partial(result, partial):
+    # A stage was cut short (deadline / upstream error): the result must not be cached
+    if partial:
+        result["Partiel"] = True
+    return result
+
+def domain_result(raw_input, domain, known, forced_sector=None):
+    return {
+        "Input": raw_input,
+        "Nom Officiel": known["Nom Officiel"],
+        "Secteur": forced_sector or known.get("Secteur") or "Unknown",
+        "Détail": f"Domaine {domain} (Correction)" if forced_sector else f"Domaine {domain}",
+        "Source": "Mémoire (Domaine)",
+        "Score": "100%",
+        "Adresse": known.get("Adresse") or "-",
+        "Région": known.get("Région") or "-",
+        "Effectif": known.get("Effectif") or "Non renseigné",
+        "Lien": known.get("Lien") or "-",
+    }
+
+class PendingAI(SimpleNamespace):
+    """
+    Row that reached the AI fallback while classified with defer_ai=True.
+    Batch paths collect these and resolve them together (one Groq request for many rows).
+    """
+
+def categorize_company_logic(raw_input, defer_ai=False):
+    started = time.perf_counter()
+    ensure_state()
+    # Cheap version checks first: reload corrections / configuration (and drop the local
+    # cache) only if another process changed them
+    refresh_corrections()
+    CONFIG.refresh()
+
+    # Cache lookup on the same key as corrections: normalize_key(extracted name)
+    try:
+        with metrics.timed("extract"):
+            company_name = extract_company_from_input(raw_input)[0]
+        cache_key = normalize_key(company_name)
+    except Exception:
+        company_name = cache_key = None
+
+    with metrics.timed("cache"):
+        cached = RESULT_CACHE.get(cache_key)
+    metrics.CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+    if cached:
+        flag_competitor(cached, company_name)
+        record_row(cached, started, "cache")
+        return {"Input": raw_input, **cached}
+
+    # Set by the pipeline when the row borrows the answer of another name (fuzzy / domain
+    # correction, similar name): save_correction cannot find it by key, so it stays local
+    lookup = SimpleNamespace(borrowed=False)
+    result = _categorize_uncached(raw_input, defer_ai, lookup)
+    if isinstance(result, PendingAI):
+        result.cache_key = cache_key
+        result.input_name = company_name
+        result.started = started
+        return result
+    flag_competitor(result, company_name)
+    cache_result(cache_key, result, shared=not lookup.borrowed)
+    record_row(result, started)
+    return result
+
+# Result "Source" -> pipeline stage that resolved the row (metrics label; web sources carry a URL)
+RESOLVED_BY_SOURCE = {
+    "Base Interne": "override",
+    "Mémoire": "correction",
+    "Mémoire (Domaine)": "domain",
+    "Officiel (API)": "api",
+    "Officiel (SIRENE)": "sirene",
+    "Mémoire (Similarité)": "semantic",
+    "Intelligence Artificielle (Groq)": "groq",
+    "Crash": "error",
+    "-": "not_found",
+}
+
+def record_row(result, started, resolved_by=None):
+    metrics.ROW_SECONDS.observe(time.perf_counter() - started)
+    if not resolved_by:
+        source = result.get("Source", "")
+        resolved_by = "error" if result.get("Secteur") == "Erreur" else RESOLVED_BY_SOURCE.get(source, "web")
+    metrics.ROWS_RESOLVED.inc(resolved_by=resolved_by)
+    if result.get("Partiel"):
+        metrics.PARTIAL_ROWS.inc()
+
+
+def resolve_pending_ai(pending):
+    """Classifies deferred rows with batched Groq requests. Returns results in the same order."""
+    names = [p.company_name for p in pending]
+    print(f"Triggering Groq batch for {len(names)} companies")
+    with metrics.timed("groq_batch"):
+        answers = analyze_batch_with_groq(names, reference_data.get().sectors, list(CONFIG.current.custom_sectors), limiter=GROQ_LIMITER, timeout=STAGE_BUDGET_AI)
+
+    results = []
+    for p, (ai_sector, ai_detail, _) in zip(pending, answers):
+        try:
+            result = finish_ai_fallback(p, ai_sector, ai_detail)
+        except Exception as e:
+            result = crash_row(p.raw_input, str(e))
+        flag_competitor(result, getattr(p, "input_name", p.company_name))
+        cache_result(p.cache_key, result)
+        record_row(result, getattr(p, "started", time.perf_counter()))
+        results.append(result)
+    return results
+
+
+def finish_ai_fallback(p, ai_sector, ai_detail):
+    """Steps 6-8 of the pipeline, once the AI answer for a row is known."""
+    # Groq failed (missing key, error, timeout): degraded result, not cached
+    partial = getattr(p, "partial", False) or is_ai_failure(ai_sector, ai_detail)
+    return mark_partial(_ai_fallback_result(p, ai_sector, ai_detail), partial)
+
+def _ai_fallback_result(p, ai_sector, ai_detail):
+    if ai_sector:
+         remember_ai_answer(p.company_name, ai_sector)
+         return {
+            "Input": p.raw_input,
+            "Nom Officiel": p.official_name, # Keep best guess official name
+            "Secteur": ai_sector,
+            "Détail": ai_detail,
+            "Source": "Intelligence Artificielle (Groq)",
+            "Score": "100%",
+            "Adresse": p.address,
+            "Région": p.region,
+            "Lien": p.final_link,
+         }
+
+    # 7. Degraded Mode: AI Failed, but we had a Web Trace
+    # If we have a URL/Title from Web Search, use it even if sector keywords were not found.
+    # This prevents blocking the user when AI quota is exceeded.
+    if p.sector_web == "Unknown" and p.title_web and p.source_web:
+         detail_msg = "Mode Dégradé (Web)"
+         if ai_detail:
+             detail_msg = f"Web (AI HS: {ai_detail})"
+
+         return {
+            "Input": p.raw_input,
+            "Nom Officiel": p.title_web if len(p.title_web) < 60 else p.official_name,
+            "Secteur": "À Vérifier / Hors Liste",
+            "Détail": detail_msg,
+            "Source": p.source_web,
+            "Score": "10% (Web)",
+            "Adresse": p.address if p.address != "Non renseigné" else "International / Web",
+            "Région": p.region if p.region != "Non renseigné" else "Monde",
+            "Lien": p.final_link,
+         }
+
+    # 8. Nothing Found
+    detail_msg = "Aucun résultat probant"
+    if ai_detail:
+         detail_msg = f"Echec AI: {ai_detail}"
+
+    return {
+        "Input": p.raw_input,
+        "Nom Officiel": p.official_name,
+        "Secteur": "Non Trouvé",
+        "Détail": detail_msg,
+        "Source": "-",
+        "Score": "0",
+        "Adresse": "-", "Région": "-", "Lien": "-",
+    }
+
+
+def _categorize_uncached(raw_input, defer_ai=False, lookup=None):
+    lookup = lookup or SimpleNamespace()
     try:
         company_name, is_valid = extract_company_from_input(raw_input)
         if not is_valid:
             return {"Input": raw_input, "Nom Officiel": "Ignoré", "Secteur": "Hors Scope", "Détail": "Email perso / invalide", "Source": "-", "Score": "0", "Adresse": "-", "Région": "-", "Lien": "-"}
 
+        # Local stages are timed lap by lap (metrics: classify_stage_seconds)
+        clock = metrics.Stopwatch()
+
         # 0. Check User Corrections (Case Insensitive)
-        # Force Reload to ensure multi-process / overlapping writes are caught
-        load_corrections()
+        # (Freshness is ensured by refresh_corrections() in categorize_company_logic)
         
         # Key in JSON is UPPERCASE.
         upper_name_clean = normalize_key(company_name)
@@ -616,19 +682,35 @@ def categorize_company_logic(raw_input):
         
         if custom_sector:
             forced_sector = custom_sector
+        clock.lap("corrections")
         
         # 1. Check Global Overrides
+        ref = reference_data.get()
         target_override = None
         # Try finding override by clean uppercase name
-        if upper_name_clean in NORMALIZED_OVERRIDES:
-             mapped_key = NORMALIZED_OVERRIDES[upper_name_clean]
-             target_override = GLOBAL_OVERRIDES.get(mapped_key)
+        if upper_name_clean in ref.normalized_overrides:
+             mapped_key = ref.normalized_overrides[upper_name_clean]
+             target_override = ref.global_overrides.get(mapped_key)
              # KEY FIX: If we have a better name (Normalized), use it for API search!
              # This helps "groupagrica" -> "GROUPE AGRICA" find results even if no hardcoded override exists.
              company_name = mapped_key # Update for API search
-        elif upper_name_clean in GLOBAL_OVERRIDES:
-             target_override = GLOBAL_OVERRIDES[upper_name_clean]
+        elif upper_name_clean in ref.global_overrides:
+             target_override = ref.global_overrides[upper_name_clean]
+        clock.lap("overrides")
         
+        # 1b. Fuzzy match (typos / variants: "SOCIETE GENRALE", "CARREFOURR")
+        if not forced_sector:
+             fuzzy_key = fuzzy_lookup(CORRECTION_INDEX, company_name)
+             if fuzzy_key:
+                  forced_sector = USER_CORRECTIONS.get(fuzzy_key)
+                  lookup.borrowed = True
+        if not target_override:
+             fuzzy_key = fuzzy_lookup(ref.override_index, company_name)
+             if fuzzy_key:
+                  target_override = ref.global_overrides.get(fuzzy_key)
+                  company_name = fuzzy_key # Real name for the API search too
+        clock.lap("fuzzy")
+
         # If Override provides explicit address, RETURN IMMEDIATELY (Skip API)
         if target_override and target_override.get("Adresse"):
              manual_link = target_override.get("Lien") 
@@ -648,13 +730,33 @@ def categorize_company_logic(raw_input):
                 "Région": target_override["Région"],
                 "Effectif": target_override.get("Effectif", "Non renseigné"),
                 "Lien": manual_link,
-                "IsCompetitor": target_override.get("IsCompetitor", check_is_competitor(target_override["Nom Officiel"]))
              }
 
+        # 1c. Email domain already resolved (API result / correction for another address)
+        domain = input_domain(raw_input)
+        if domain:
+             if not forced_sector:
+                  forced_sector = CORRECTION_DOMAINS.get(domain)
+                  lookup.borrowed = bool(forced_sector)
+             known = DOMAIN_INDEX.get(domain)
+             clock.lap("domain")
+             if known:
+                  return domain_result(raw_input, domain, known, forced_sector)
+
+        # Row deadline starts here (overrides above are instant)
+        deadline = Deadline(ROW_DEADLINE)
+        # Set when a stage is cut short (timeout / upstream error): the result is not cached
+        partial = False
+
+        web_future = None
+        if not forced_sector and should_speculate_web(raw_input):
+             # Speculative: runs during the API call, dropped if the API answers
+             web_future = speculate(analyze_web_content, company_name, deadline.budget(STAGE_BUDGET_WEB))
+
         # 2. Call API
-        api_url = f"https://recherche-entreprises.api.gouv.fr/search?q={company_name}&per_page=5"
         
         naf_code = None
+        api_source = "Officiel (API)"
         official_name = company_name
         address = "Non renseigné"
         region = "Non renseigné"
@@ -663,50 +765,50 @@ def categorize_company_logic(raw_input):
         search_success = False
 
         try:
-            response = requests.get(api_url)
-            if response.status_code == 200:
-                data = response.json()
-                if data and data['results']:
-                    # Loop to find the first non-CSE/COMITE result
-                    best_res = None
-                    for res in data['results']:
-                         name_check = res.get('nom_complet', '').upper()
-                         if "COMITE" not in name_check and "CSE " not in name_check:
-                              best_res = res
-                              break
+            with metrics.timed("api"):
+                data, api_source = search_companies(company_name, deadline.budget(STAGE_BUDGET_API))
+            if data is None:
+                # 429 / 5xx after retries: "no match" is not known, the row must not be cached
+                partial = True
+            if data and data['results']:
+                # Best candidate on name / headcount / status / siège (not just the first non-CSE)
+                with metrics.timed("ranking"):
+                    best_res = pick_candidate(company_name, data['results'])
+                
+                if best_res:
+                    search_success = True
+                    naf_code = best_res.get('activite_principale')
+                    official_name = best_res.get('nom_complet')
+                    
+                    siege = best_res.get('siege', {})
+                    address = siege.get('adresse', best_res.get('adresse', ''))
+                    region = siege.get('libelle_region', '')
+                    if not region: region = best_res.get('region', '')
+                    
+                    # Fallback Region from Dept
+                    cp = siege.get('code_postal', '')
+                    if not region and cp:
+                         region = get_region_from_dept(cp)
+                    
+                    siren = best_res.get('siren')
+                    if siren: link_url = f"https://annuaire-entreprises.data.gouv.fr/entreprise/{siren}"
                     
-                    if not best_res: best_res = data['results'][0]
+                    # Map Effectif Code to Text
+                    tranche_code = best_res.get('tranche_effectif_salarie')
+                    effectif_text = reference_data.get().tranche_effectifs.get(tranche_code, "Non renseigné")
+                    # If unknown code, keep it raw or default
+                    if not effectif_text and tranche_code: effectif_text = f"Code: {tranche_code}"
+                    best_res['tranche_effectif_salarie'] = effectif_text
                     
-                    if best_res:
-                        search_success = True
-                        naf_code = best_res.get('activite_principale')
-                        official_name = best_res.get('nom_complet')
-                        
-                        siege = best_res.get('siege', {})
-                        address = siege.get('adresse', best_res.get('adresse', ''))
-                        region = siege.get('libelle_region', '')
-                        if not region: region = best_res.get('region', '')
-                        
-                        # Fallback Region from Dept
-                        cp = siege.get('code_postal', '')
-                        if not region and cp:
-                             region = get_region_from_dept(cp)
-                        
-                        siren = best_res.get('siren')
-                        if siren: link_url = f"https://annuaire-entreprises.data.gouv.fr/entreprise/{siren}"
-                        
-                        # Map Effectif Code to Text
-                        tranche_code = best_res.get('tranche_effectif_salarie')
-                        effectif_text = TRANCHE_EFFECTIFS.get(tranche_code, "Non renseigné")
-                        # If unknown code, keep it raw or default
-                        if not effectif_text and tranche_code: effectif_text = f"Code: {tranche_code}"
-                        best_res['tranche_effectif_salarie'] = effectif_text
-                        
         except Exception as e:
             print(f"API Call Error: {e}")
+            partial = True
 
         # 3. Determine Final Result
         if search_success:
+            if web_future:
+                web_future.cancel()
+
             # If we had a forced sector from overrides, use it
             final_sector = forced_sector if forced_sector else get_sector_from_naf(naf_code)
             
@@ -716,15 +818,18 @@ def categorize_company_logic(raw_input):
             
             if not final_sector: final_sector = "Unknown"
 
-            # Check Competitor (Strict Word Boundary Match)
-            # Check Competitor (Strict Word Boundary Match)
-            # Use the new robust helper function
-            is_competitor = check_is_competitor(official_name)
-            
-            # Additional Check: If forced_sector name matches competitor list
-            if not is_competitor and forced_sector and forced_sector.upper() in COMPETITORS:
-                 # Unlikely case but safety check
-                 pass
+            if domain:
+                 # Every other address of this domain is now answered locally
+                 DOMAIN_INDEX.learn(domain, {
+                      "Nom Officiel": official_name,
+                      "siren": siren,
+                      "naf": naf_code,
+                      "Secteur": get_sector_from_naf(naf_code) or (target_override or {}).get("Secteur") or "Unknown",
+                      "Adresse": address,
+                      "Région": region,
+                      "Effectif": best_res.get('tranche_effectif_salarie'),
+                      "Lien": link_url,
+                 })
 
             return {
                 "Input": raw_input,
@@ -732,12 +837,11 @@ def categorize_company_logic(raw_input):
                 "Secteur": final_sector,
                 "Secteur": final_sector,
                 "Détail": "Override + API" if forced_sector else f"Code NAF: {naf_code}",
-                "Source": "Officiel (API)",
+                "Source": api_source,
                 "Score": "100%",
                 "Adresse": address,
                 "Région": region,
                 "Lien": link_url,
-                "IsCompetitor": is_competitor,
                 "Effectif": best_res.get('tranche_effectif_salarie')
             }
             
@@ -746,7 +850,8 @@ def categorize_company_logic(raw_input):
         # But if we are here, we have neither robust API result nor specific override address.
         # Check overrides one last time for sector only?
         if forced_sector:
-             return {
+             # API failed / timed out: the sector is right but the registry details are missing
+             return mark_partial({
                 "Input": raw_input,
                 "Nom Officiel": company_name,
                 "Secteur": forced_sector,
@@ -755,10 +860,22 @@ def categorize_company_logic(raw_input):
                 "Score": "100%",
                 "Adresse": "-", "Région": "-", "Lien": "-",
                 "Adresse": "-", "Région": "-", "Lien": "-",
-                "IsCompetitor": check_is_competitor(company_name)
-             }
+             }, partial)
              
-        sector_web, source_web, score_web, title_web = analyze_web_content(company_name)
+        with metrics.timed("web"):
+             if web_future:
+                  try:
+                       web_result = web_future.result(timeout=deadline.remaining())
+                  except Exception:
+                       web_future.cancel()
+                       web_result = None, "Web: délai dépassé", 0, ""
+             elif deadline.expired():
+                  web_result = None, "Web: délai dépassé", 0, ""
+             else:
+                  web_result = analyze_web_content(company_name, deadline.budget(STAGE_BUDGET_WEB))
+        sector_web, source_web, score_web, title_web = web_result
+        if source_web == "Web: délai dépassé":
+             partial = True
         
         final_link = link_url
         if final_link == "-" or not final_link:
@@ -766,7 +883,7 @@ def categorize_company_logic(raw_input):
 
         # Fix: Only accept Web Result if it is NOT "Unknown"
         if sector_web and sector_web != "Unknown":
-             return {
+             return mark_partial({
                 "Input": raw_input,
                 "Nom Officiel": title_web if title_web and len(title_web) < 60 else official_name,
                 "Secteur": sector_web,
@@ -776,64 +893,44 @@ def categorize_company_logic(raw_input):
                 "Adresse": address if address != "Non renseigné" else "International / Web",
                 "Région": region if region != "Non renseigné" else "Monde",
                 "Lien": final_link,
-                "IsCompetitor": check_is_competitor(official_name) or check_is_competitor(company_name)
-             }
+             }, partial)
              
-        # 5. Fallback AI (Groq) - Last Resort
-        print(f"Triggering Groq for: {company_name}")
-        ai_sector, ai_detail, ai_score = analyze_with_groq(company_name, list(SECTOR_CONFIG.keys()), CUSTOM_SECTORS)
-        
-        if ai_sector:
-             return {
+        # 5. Semantic Cache: a near-identical name was already classified (no LLM call)
+        with metrics.timed("semantic"):
+             similar = SEMANTIC_INDEX.search(company_name, SEMANTIC_THRESHOLD)
+        if similar:
+             similar_sector, similar_name, similarity = similar
+             lookup.borrowed = True
+             return mark_partial({
                 "Input": raw_input,
-                "Nom Officiel": official_name, # Keep best guess official name
-                "Secteur": ai_sector,
-                "Détail": ai_detail,
-                "Source": "Intelligence Artificielle (Groq)",
-                "Score": "100%",
+                "Nom Officiel": official_name,
+                "Secteur": similar_sector,
+                "Détail": f"Similaire à {similar_name} ({similarity:.0%})",
+                "Source": "Mémoire (Similarité)",
+                "Score": f"{int(similarity * 100)}%",
                 "Adresse": address,
                 "Région": region,
                 "Lien": final_link,
-                "IsCompetitor": check_is_competitor(official_name)
-             }
+             }, partial)
 
-        
-        # 6. Degraded Mode: AI Failed, but we had a Web Trace
-        # If we have a URL/Title from Web Search, use it even if sector keywords were not found.
-        # This prevents blocking the user when AI quota is exceeded.
-        if sector_web == "Unknown" and title_web and source_web:
-             detail_msg = "Mode Dégradé (Web)"
-             if 'ai_detail' in locals() and ai_detail:
-                 detail_msg = f"Web (AI HS: {ai_detail})"
-             
-             return {
-                "Input": raw_input,
-                "Nom Officiel": title_web if len(title_web) < 60 else official_name,
-                "Secteur": "À Vérifier / Hors Liste",
-                "Détail": detail_msg,
-                "Source": source_web,
-                "Score": "10% (Web)",
-                "Adresse": address if address != "Non renseigné" else "International / Web",
-                "Région": region if region != "Non renseigné" else "Monde",
-                "Lien": final_link,
-                "IsCompetitor": check_is_competitor(title_web) or check_is_competitor(company_name)
-             }
+        # 6. Fallback AI (Groq) - Last Resort
+        pending = PendingAI(
+            raw_input=raw_input, company_name=company_name, official_name=official_name,
+            address=address, region=region, final_link=final_link,
+            sector_web=sector_web, source_web=source_web, title_web=title_web, partial=partial,
+        )
+        if defer_ai:
+            return pending
 
-        # 7. Nothing Found
-        detail_msg = "Aucun résultat probant"
-        if 'ai_detail' in locals() and ai_detail:
-             detail_msg = f"Echec AI: {ai_detail}"
+        # Out of time: best result so far (web trace or not found), without the AI
+        if deadline.expired() or not GROQ_LIMITER.acquire(timeout=deadline.remaining()):
+            pending.partial = True
+            return finish_ai_fallback(pending, None, "Délai dépassé")
 
-        return {
-            "Input": raw_input,
-            "Nom Officiel": official_name,
-            "Secteur": "Non Trouvé",
-            "Détail": detail_msg,
-            "Source": "-",
-            "Score": "0",
-            "Adresse": "-", "Région": "-", "Lien": "-",
-            "IsCompetitor": check_is_competitor(official_name)
-        }
+        print(f"Triggering Groq for: {company_name}")
+        with metrics.timed("groq"):
+             ai_sector, ai_detail, ai_score = analyze_with_groq(company_name, reference_data.get().sectors, list(CONFIG.current.custom_sectors), timeout=deadline.budget(STAGE_BUDGET_AI))
+        return finish_ai_fallback(pending, ai_sector, ai_detail)
 
     except Exception as e:
         return { 
@@ -850,9 +947,11 @@ def categorize_company_logic(raw_input):
 
 @app.route('/')
 def index():
+    ensure_state()
+    custom_sectors = list(CONFIG.refresh().custom_sectors)
     # Combine standard + custom sectors
-    all_sectors = sorted(list(SECTOR_CONFIG.keys()) + CUSTOM_SECTORS)
-    return render_template('index.html', sectors=all_sectors, custom_sectors=CUSTOM_SECTORS)
+    all_sectors = sorted(reference_data.get().sectors + custom_sectors)
+    return render_template('index.html', sectors=all_sectors, custom_sectors=custom_sectors, jobs_enabled=jobs_available())
 
 @app.route('/api/categorize', methods=['POST'])
 def api_categorize():
@@ -861,9 +960,24 @@ def api_categorize():
     if not company_input:
         return jsonify({"error": "No input provided"}), 400
     
+    # Optional per-request breakdown: {"input": ..., "timings": true} or ?timings=1
+    if data.get('timings') or request.args.get('timings'):
+        with metrics.trace() as timings:
+            result = categorize_company_logic(company_input)
+        return jsonify({**result, "Timings": timings})
+
     result = categorize_company_logic(company_input)
     return jsonify(result)
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    # Per-host outbound latency / error counters (same series as /metrics)
+    return jsonify({"http": metrics.upstream_stats()})
+
 @app.route('/api/override', methods=['POST'])
 def override_sector():
     data = request.json
@@ -878,12 +992,12 @@ def override_sector():
         save_correction(normalized_name.upper(), sector)
         
         # Determine if it's a new custom sector
-        standard_sectors = list(SECTOR_CONFIG.keys())
-        if sector not in standard_sectors and sector not in CUSTOM_SECTORS:
-            CUSTOM_SECTORS.append(sector)
-            save_custom_sectors()
+        standard_sectors = reference_data.get().sectors
+        custom_sectors = CONFIG.refresh(force=True).custom_sectors
+        if sector not in standard_sectors and sector not in custom_sectors:
+            custom_sectors = CONFIG.add("custom_sectors", sector).custom_sectors
             
-        return jsonify({"status": "success", "sector": sector, "is_new": sector in CUSTOM_SECTORS})
+        return jsonify({"status": "success", "sector": sector, "is_new": sector in custom_sectors})
     return jsonify({"error": "Missing data"}), 400
 
 @app.route('/api/delete_sector', methods=['POST'])
@@ -891,12 +1005,168 @@ def delete_sector():
     data = request.json
     sector = data.get('sector')
     
-    if sector in CUSTOM_SECTORS:
-        CUSTOM_SECTORS.remove(sector)
-        save_custom_sectors()
+    ensure_state()
+    custom_sectors = CONFIG.refresh(force=True).custom_sectors
+    if sector in custom_sectors:
+        CONFIG.remove("custom_sectors", sector)
+        RESULT_CACHE.invalidate_tag(sector)
         return jsonify({"status": "success", "message": "Sector deleted"})
     return jsonify({"error": "Sector not found or cannot delete standard sector"}), 400
 
+@app.route('/api/competitors', methods=['GET'])
+def list_competitors():
+    ensure_state()
+    return jsonify({"competitors": sorted(CONFIG.refresh().competitors.names)})
+
+@app.route('/api/competitors', methods=['POST'])
+def add_competitor():
+    data = request.json or {}
+    name = str(data.get('name') or '').strip().upper()
+    if not name:
+        return jsonify({"error": "Missing data"}), 400
+
+    ensure_state()
+    competitors = CONFIG.refresh(force=True).competitors
+    if name not in competitors:
+        competitors = CONFIG.add("competitors", name).competitors
+    return jsonify({"status": "success", "competitors": sorted(competitors.names)})
+
+@app.route('/api/delete_competitor', methods=['POST'])
+def delete_competitor():
+    data = request.json or {}
+    name = str(data.get('name') or '').strip().upper()
+
+    ensure_state()
+    competitors = CONFIG.refresh(force=True).competitors
+    if name in competitors:
+        competitors = CONFIG.remove("competitors", name).competitors
+        return jsonify({"status": "success", "competitors": sorted(competitors.names)})
+    return jsonify({"error": "Competitor not found"}), 400
+
+def crash_row(line, detail):
+    return {"Input": line, "Nom Officiel": "Erreur", "Secteur": "Erreur", "Détail": detail, "Source": "Crash", "Score": "0", "Adresse": "-", "Région": "-", "Lien": "-"}
+
+def classify_row(line, defer_ai=False):
+    # Batch worker: a crashing row becomes an error row instead of disappearing
+    try:
+        return categorize_company_logic(line, defer_ai)
+    except Exception as e:
+        print(f"Batch Error on {line}: {e}")
+        return crash_row(line, str(e))
+
+def canonical_key(raw_input):
+    """
+    Rows with the same key take the exact same path through the pipeline (only "Input"
+    differs): extracted name after override aliasing, its user correction, and the email
+    domain. None when the row cannot be keyed.
+    """
+    try:
+        key = normalize_key(extract_company_from_input(raw_input)[0])
+    except Exception:
+        return None
+    if not key:
+        return None
+    return (reference_data.get().normalized_overrides.get(key, key), USER_CORRECTIONS.get(key), input_domain(raw_input))
+
+class DuplicateRow(SimpleNamespace):
+    """Row whose canonical key is already being classified in the same batch (see iter_classified)."""
+
+def iter_classified(lines):
+    """
+    Batch classification: yields (index, result) in completion order.
+    Rows that fall through to the AI are held back and sent to Groq together,
+    GROQ_BATCH_MAX_ITEMS at a time (the last group when the input is exhausted).
+    Duplicates ("x@bnpparibas.com" / "y@bnpparibas.com", "COCACOLA" / "Coca Cola") are
+    classified once: a row whose key is in flight waits for that row's result, a later one
+    hits the result cache.
+    """
+    pending = []
+    rows = {}       # index -> raw input of the rows being classified (not the duplicates)
+    in_flight = {}  # canonical key -> index of the row classifying it
+    followers = {}  # leader index -> (key, [DuplicateRow])
+
+    def keyed(lines):
+        ensure_state()
+        refresh_corrections()
+        CONFIG.refresh()
+        for index, line in enumerate(lines):
+            key = canonical_key(line)
+            if key in in_flight:
+                followers[in_flight[key]][1].append(DuplicateRow(index=index, raw_input=line, started=time.perf_counter()))
+                yield None
+            else:
+                rows[index] = line
+                if key:
+                    in_flight[key] = index
+                    followers[index] = (key, [])
+                yield line
+
+    def settle(index, result):
+        # Final result of a row (None: crashed, or a duplicate's empty slot),
+        # fanned out to the duplicates that waited for it: one output per input line
+        line = rows.pop(index, None)
+        if index in followers:
+            key, waiting = followers.pop(index)
+            del in_flight[key]
+        else:
+            waiting = []
+        if result is None:
+            if line is None:
+                return
+            result = crash_row(line, "Erreur de traitement")
+        yield index, result
+        for dup in waiting:
+            record_row(result, dup.started, "duplicate")
+            yield dup.index, {**result, "Input": dup.raw_input}
+
+    def flush():
+        rows = list(pending)
+        pending.clear()
+        for index, result in zip([index for index, _ in rows], resolve_pending_ai([p for _, p in rows])):
+            yield from settle(index, result)
+
+    # Duplicates go through iter_batch as None (free slot) to keep the input indexes
+    for index, result in iter_batch(keyed(lines), lambda line: None if line is None else classify_row(line, defer_ai=True)):
+        if isinstance(result, PendingAI):
+            pending.append((index, result))
+            if len(pending) >= GROQ_BATCH_MAX_ITEMS:
+                yield from flush()
+        else:
+            yield from settle(index, result)
+    if pending:
+        yield from flush()
+
+def classify_batch(lines):
+    """Same as iter_classified, collected in input order."""
+    lines = list(lines)
+    results = [None] * len(lines)
+    for index, result in iter_classified(lines):
+        results[index] = result
+    return [r for r in results if r is not None]
+
+def stream_batch(lines, total=None):
+    """
+    NDJSON generator: one line per classified row, in completion order, as soon as it is ready.
+    `lines` may be a lazy iterable (streamed upload): total is then null until the end.
+    {"type": "start", "total": N}
+    {"type": "result", "index": i, "processed": k, "total": N, "result": {...}}
+    {"type": "done", "processed": N, "total": N}
+    """
+    if total is None and isinstance(lines, list):
+        total = len(lines)
+    yield json.dumps({"type": "start", "total": total}) + "\n"
+
+    processed = 0
+    for index, result in iter_classified(lines):
+        processed += 1
+        yield json.dumps({"type": "result", "index": index, "processed": processed, "total": total, "result": result}, ensure_ascii=False) + "\n"
+
+    yield json.dumps({"type": "done", "processed": processed, "total": processed}) + "\n"
+
+def ndjson_response(generator):
+    # X-Accel-Buffering: disable proxy buffering so rows reach the browser immediately
+    return Response(generator, mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/api/upload', methods=['POST'])
 def api_upload():
     if 'file' not in request.files:
@@ -905,38 +1175,35 @@ def api_upload():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     
-    filename = file.filename.lower()
-    inputs = []
-    
     try:
-        if filename.endswith('.csv'):
-            # Read CSV using standard library
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.reader(stream)
-            for row in csv_input:
-                if row:
-                     inputs.append(str(row[0])) # Take first column
-
-        elif filename.endswith(('.xls', '.xlsx')):
-            # Read Excel using openpyxl
-            wb = load_workbook(file)
-            ws = wb.active
-            # Iterate rows, take first column
-            for row in ws.iter_rows(values_only=True):
-                if row and row[0]:
-                    inputs.append(str(row[0]))
-        else:
-             return jsonify({"error": "Format non supporté (CSV ou Excel)"}), 400
+        # Streamed read (read-only Excel / incremental CSV decode), optional ?column= / form "column"
+        lines = iter_upload_rows(file, request.values.get('column'))
              
         # Process the list (same as batch)
-        results = []
-        for i, line in enumerate(inputs):
-            if line.strip():
-                 if i > 0: time.sleep(1.0) # Rate limit
-                 results.append(categorize_company_logic(line))
+        results = classify_batch(lines)
         
         return jsonify({"results": results})
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/upload/stream', methods=['POST'])
+def api_upload_stream():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part"}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No selected file"}), 400
+
+    try:
+        # Rows go from the upload straight into the classifier: nothing is collected in memory
+        lines = iter_upload_rows(take_upload(file), request.values.get('column'))
+        return ndjson_response(stream_batch(lines))
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -948,116 +1215,136 @@ def api_batch():
              return jsonify({"error": "Invalid JSON/Empty Body"}), 400
              
         inputs = data.get('inputs', [])
-        results = []
+        lines = [str(line) for line in inputs if str(line).strip()] # Safety cast
         
-        for i, line in enumerate(inputs):
-            if not isinstance(line, str): line = str(line) # Safety cast
-            
-            if line.strip():
-                # Basic rate limiting for batch to avoid flooding Google if many requests
-                if i > 0: time.sleep(1.0)
-                try:
-                    results.append(categorize_company_logic(line))
-                except Exception as e:
-                    print(f"Batch Error on {line}: {e}")
+        # Rows run concurrently; upstream pacing is handled by the per-host rate limiters
+        # and AI-fallback rows share Groq requests
+        results = classify_batch(lines)
         
         return jsonify({"results": results})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/export_excel', methods=['POST'])
-def export_excel():
+@app.route('/api/batch/stream', methods=['POST'])
+def api_batch_stream():
+    data = request.json
+    if not data:
+         return jsonify({"error": "Invalid JSON/Empty Body"}), 400
+
+    inputs = data.get('inputs', [])
+    lines = [str(line) for line in inputs if str(line).strip()] # Safety cast
+    return ndjson_response(stream_batch(lines))
+
+# --- Background Jobs (large imports) ---
+JOB_MANAGER = None
+
+def get_job_manager():
+    # Created on first use: picking the store needs the (lazy) Redis connection
+    global JOB_MANAGER
+    if JOB_MANAGER is None:
+        with _STATE_LOCK:
+            if JOB_MANAGER is None:
+                JOB_MANAGER = JobManager(create_store(redis_client), iter_classified)
+    return JOB_MANAGER
+
+# Vercel freezes the function once the response is sent: in-process worker threads stop too
+SERVERLESS = bool(os.environ.get("VERCEL"))
+
+def jobs_available():
+    """
+    A job outlives its upload only with a shared store (Redis: every instance sees it) and a
+    worker that keeps running after the response. Otherwise the UI streams imports instead.
+    """
+    return bool(redis_client) and (JOB_EXTERNAL_WORKER or not SERVERLESS)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
     try:
-        data = request.json
-        if not data or 'results' not in data:
-            return jsonify({"error": "No data to export"}), 400
-        
-        results = data['results']
-        
-        # Prepare DataFrame
-        # Prepare Data for Excel
-        headers = ["Input", "Nom Officiel", "Secteur", "Adresse", "Région", "Effectif", "Lien", "Score", "Détails"]
-        
-        # Save to a temporary file (or in memory)
-        output = io.BytesIO()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Resultats"
-        
-        # Write Header
-        ws.append(headers)
-        
-        # Write Data
-        for row in results:
-            ws.append([
-                row.get("Input"),
-                row.get("Nom Officiel"),
-                row.get("Secteur"),
-                row.get("Adresse"),
-                row.get("Région"),
-                row.get("Effectif"),
-                row.get("Lien"),
-                row.get("Score"),
-                row.get("Détail")
-            ])
-            
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        thin_border = Border(left=Side(style='thin'), 
-                                right=Side(style='thin'), 
-                                top=Side(style='thin'), 
-                                bottom=Side(style='thin'))
-        
-        # Apply Filter
-        ws.auto_filter.ref = ws.dimensions
-        
-        # Freeze Top Row
-        ws.freeze_panes = 'A2'
-        
-        # Style headers
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin_border
-            
-        # Style Body and Adjust Width
-        # Calculate max width for each column
-        column_widths = []
-        for row in ws.iter_rows():
-            for i, cell in enumerate(row):
-                if len(column_widths) <= i:
-                    column_widths.append(0)
-                length = len(str(cell.value)) if cell.value else 0
-                if length > column_widths[i]:
-                    column_widths[i] = length
-                    
-        for i, column_width in enumerate(column_widths):
-            ws.column_dimensions[chr(65 + i)].width = min(column_width + 4, 60)
-            
-        # Borders for all cells
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.border = thin_border
-                if cell.row > 1:
-                     cell.alignment = Alignment(vertical="center")
-
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=f"export_entreprises_{int(time.time())}.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-            
+        if 'file' in request.files:
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({"error": "No selected file"}), 400
+            # Stored page by page while reading: memory stays flat on very large files
+            lines = iter_upload_rows(file, request.values.get('column'))
+            filename = file.filename
+        else:
+            data = request.json or {}
+            lines = [str(line) for line in data.get('inputs', []) if str(line).strip()]
+            filename = ""
+
+        manager = get_job_manager()
+        job_id = manager.create_job(lines, filename)
+        manager.ensure_workers()
+        return jsonify({"job_id": job_id, **manager.store.get_meta(job_id)}), 202
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Export Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    meta = get_job_manager().store.get_meta(job_id)
+    if not meta:
+        return jsonify({"error": "Job not found"}), 404
+    if meta.get("status") in ("queued", "running"):
+        # Web process may have been recycled since the upload: make sure someone works on it
+        get_job_manager().ensure_workers()
+    return jsonify({"job_id": job_id, **meta})
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Partial results: rows completed since `cursor` (completion order), with their input index."""
+    meta = get_job_manager().store.get_meta(job_id)
+    if not meta:
+        return jsonify({"error": "Job not found"}), 404
+    if meta.get("status") in ("queued", "running"):
+        # The UI only polls this route: restart the workers here too after a recycle
+        get_job_manager().ensure_workers()
+
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    rows = get_job_manager().store.get_results_since(job_id, cursor, limit)
+    return jsonify({
+        "job_id": job_id,
+        **meta,
+        "results": [{"index": index, "result": result} for index, result in rows],
+        "cursor": cursor + len(rows),
+    })
+
+def timed_stream(chunks, stage):
+    # Streamed body: the stage lasts until the last chunk is sent
+    with metrics.timed(stage):
+        yield from chunks
+
+def export_response(results, fmt, basename):
+    """Streamed download of results (any iterable) as xlsx / csv / ndjson."""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Format d'export inconnu: {fmt}"}), 400
+    extension, mimetype = EXPORT_FORMATS[fmt]
+    return Response(timed_stream(iter_export(results, fmt), "export"), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{basename}.{extension}"',
+        "Cache-Control": "no-cache",
+    })
+
+@app.route('/api/jobs/<job_id>/export', methods=['GET'])
+def job_export(job_id):
+    # Exports the stored results directly: the browser does not re-post the whole list
+    store = get_job_manager().store
+    if not store.get_meta(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    fmt = request.args.get('format', 'xlsx')
+    return export_response(store.iter_results_ordered(job_id), fmt, f"export_entreprises_{job_id[:8]}")
+
+@app.route('/api/export_excel', methods=['POST'])
+def export_excel():
+    data = request.json
+    if not data or 'results' not in data:
+        return jsonify({"error": "No data to export"}), 400
+    fmt = data.get('format') or request.args.get('format', 'xlsx')
+    return export_response(data['results'], fmt, f"export_entreprises_{int(time.time())}")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=True)
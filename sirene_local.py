@@ -0,0 +1,251 @@
+"""
+Offline SIRENE resolver.
+
+Ingests the public INSEE dumps (StockUniteLegale / StockEtablissement, CSV or zipped CSV)
+into a local SQLite database, then answers name -> (SIREN, NAF, siège address, tranche effectif)
+lookups in-process, in the same shape as recherche-entreprises.api.gouv.fr results.
+
+Import (streams the multi-GB files in bounded memory):
+    python sirene_local.py import --unites StockUniteLegale_utf8.zip --etablissements StockEtablissement_utf8.zip --db sirene.db
+
+Lookup from the command line:
+    python sirene_local.py search "BNP PARIBAS" --db sirene.db
+"""
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+
+from matchers import LEGAL_FORMS, normalize_name
+
+BATCH_SIZE = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS unite_legale (
+    siren TEXT PRIMARY KEY,
+    nom TEXT NOT NULL,
+    nom_norm TEXT NOT NULL,
+    sigle_norm TEXT,
+    naf TEXT,
+    tranche TEXT,
+    etat TEXT
+);
+CREATE TABLE IF NOT EXISTS siege (
+    siren TEXT PRIMARY KEY,
+    adresse TEXT,
+    code_postal TEXT,
+    commune TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS unite_legale_fts USING fts5(
+    nom, content='unite_legale', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_unite_legale_nom_norm ON unite_legale(nom_norm);
+CREATE INDEX IF NOT EXISTS idx_unite_legale_sigle_norm ON unite_legale(sigle_norm);
+"""
+
+
+# --- Import ---
+
+def _open_csv(path):
+    """Streams a CSV (or the first CSV inside a zip) as dict rows."""
+    if path.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        member = next(n for n in archive.namelist() if n.lower().endswith(".csv"))
+        stream = io.TextIOWrapper(archive.open(member), encoding="utf-8", newline="")
+    else:
+        stream = open(path, "r", encoding="utf-8", newline="")
+    return csv.DictReader(stream)
+
+
+def _flush(conn, sql, batch):
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+        batch.clear()
+
+
+def import_unites_legales(conn, path):
+    sql = "INSERT OR REPLACE INTO unite_legale (siren, nom, nom_norm, sigle_norm, naf, tranche, etat) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    batch, count = [], 0
+    for row in _open_csv(path):
+        # Legal entities only: individual companies (EI) carry a person's name, not a denomination
+        nom = row.get("denominationUniteLegale") or row.get("denominationUsuelle1UniteLegale")
+        if not nom:
+            continue
+        sigle = row.get("sigleUniteLegale") or ""
+        batch.append((
+            row["siren"], nom, normalize_name(nom), normalize_name(sigle) or None,
+            row.get("activitePrincipaleUniteLegale"), row.get("trancheEffectifsUniteLegale") or "NN",
+            row.get("etatAdministratifUniteLegale"),
+        ))
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            _flush(conn, sql, batch)
+            print(f"  unités légales: {count}")
+    _flush(conn, sql, batch)
+    return count
+
+
+def import_etablissements(conn, path):
+    sql = "INSERT OR REPLACE INTO siege (siren, adresse, code_postal, commune) VALUES (?, ?, ?, ?)"
+    batch, count = [], 0
+    for row in _open_csv(path):
+        if row.get("etablissementSiege") != "true":
+            continue
+        code_postal = row.get("codePostalEtablissement") or ""
+        commune = row.get("libelleCommuneEtablissement") or ""
+        voie = " ".join(filter(None, [
+            row.get("numeroVoieEtablissement"), row.get("indiceRepetitionEtablissement"),
+            row.get("typeVoieEtablissement"), row.get("libelleVoieEtablissement"),
+        ]))
+        adresse = " ".join(filter(None, [voie, code_postal, commune]))
+        batch.append((row["siren"], adresse, code_postal, commune))
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            _flush(conn, sql, batch)
+            print(f"  sièges: {count}")
+    _flush(conn, sql, batch)
+    return count
+
+
+def build_database(db_path, unites_path=None, etablissements_path=None):
+    conn = sqlite3.connect(db_path)
+    # Bulk-load settings: the file is rebuilt from the dumps if the import is interrupted
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    start = time.time()
+    if unites_path:
+        print(f"Import {unites_path}...")
+        print(f"  -> {import_unites_legales(conn, unites_path)} unités légales")
+    if etablissements_path:
+        print(f"Import {etablissements_path}...")
+        print(f"  -> {import_etablissements(conn, etablissements_path)} sièges")
+
+    print("Indexation...")
+    conn.executescript(INDEXES)
+    conn.execute("INSERT INTO unite_legale_fts(unite_legale_fts) VALUES('rebuild')")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Done in {time.time() - start:.0f}s -> {db_path}")
+
+
+# --- Lookup ---
+
+class SireneIndex:
+    """Read-only, thread-safe (one connection per thread) lookup over an imported database."""
+
+    SELECT = """
+        SELECT u.siren, u.nom, u.naf, u.tranche, u.etat, s.adresse, s.code_postal, s.commune
+        FROM unite_legale u LEFT JOIN siege s ON s.siren = u.siren
+    """
+    # Active first, then biggest headcount bracket ("NN" = unknown sorts last)
+    ORDER = """
+        ORDER BY u.etat = 'A' DESC,
+                 CASE WHEN u.tranche GLOB '[0-9][0-9]' THEN u.tranche ELSE '' END DESC
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def search(self, name, limit=5):
+        """Returns candidates shaped like recherche-entreprises 'results' entries."""
+        key = normalize_name(name)
+        if not key:
+            return []
+        for query_key in dict.fromkeys([key, _strip_legal_forms(key)]):
+            if query_key:
+                results = self._search_key(query_key, limit)
+                if results:
+                    return results
+        return []
+
+    def _search_key(self, key, limit):
+        conn = self._conn()
+
+        # 1. Exact name / acronym match (indexed)
+        rows = conn.execute(
+            self.SELECT + " WHERE u.nom_norm = ? OR u.sigle_norm = ?" + self.ORDER + " LIMIT ?",
+            (key, key, limit),
+        ).fetchall()
+
+        # 2. Full-text match on every word of the name
+        if not rows:
+            query = " ".join(f'"{token}"' for token in key.split())
+            rows = conn.execute(
+                self.SELECT + " JOIN unite_legale_fts f ON f.rowid = u.rowid"
+                " WHERE unite_legale_fts MATCH ? ORDER BY bm25(unite_legale_fts), u.etat = 'A' DESC LIMIT ?",
+                (query, limit),
+            ).fetchall()
+
+        return [self._to_result(row) for row in rows]
+
+    @staticmethod
+    def _to_result(row):
+        siren, nom, naf, tranche, etat, adresse, code_postal, commune = row
+        return {
+            "siren": siren,
+            "nom_complet": nom,
+            "activite_principale": naf,
+            "tranche_effectif_salarie": tranche,
+            "etat_administratif": etat,
+            "siege": {"adresse": adresse or "", "code_postal": code_postal or "", "libelle_commune": commune or ""},
+        }
+
+
+def _strip_legal_forms(key):
+    return " ".join(token for token in key.split() if token not in LEGAL_FORMS)
+
+
+def load_index(db_path):
+    """Returns a SireneIndex if the database file exists, else None."""
+    if db_path and os.path.exists(db_path):
+        return SireneIndex(db_path)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SIRENE base (import / search)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import")
+    p_import.add_argument("--unites", help="StockUniteLegale CSV or zip")
+    p_import.add_argument("--etablissements", help="StockEtablissement CSV or zip")
+    p_import.add_argument("--db", default="sirene.db")
+
+    p_search = sub.add_parser("search")
+    p_search.add_argument("name")
+    p_search.add_argument("--db", default="sirene.db")
+
+    args = parser.parse_args()
+    if args.command == "import":
+        if not args.unites and not args.etablissements:
+            parser.error("--unites and/or --etablissements required")
+        build_database(args.db, args.unites, args.etablissements)
+    else:
+        index = load_index(args.db)
+        if not index:
+            sys.exit(f"Base introuvable: {args.db}")
+        start = time.perf_counter()
+        results = index.search(args.name)
+        print(f"{len(results)} résultat(s) en {(time.perf_counter() - start) * 1000:.2f} ms")
+        for res in results:
+            print(res)
@@ -1,5 +1,6 @@
 const API_URL = "/api";
 let currentData = [];
+let currentJobId = null; // Background job behind the current results (file imports)
 
 // Drag and Drop Logic
 const dropZone = document.getElementById('dropZone');
@@ -41,21 +42,30 @@ fileInput.addEventListener('change', (e) => {
 async function handleFile(file) {
     const formData = new FormData();
     formData.append('file', file);
+    // Optional column (header name, letter or number); default is the first column
+    const column = document.getElementById('columnInput').value.trim();
+    if (column) formData.append('column', column);
 
     // UI Loading
     const dropHTML = dropZone.innerHTML;
     dropZone.innerHTML = '<i class="fa-solid fa-spinner fa-spin upload-icon"></i><p>Traitement en cours...</p>';
 
     try {
-        const response = await fetch(`${API_URL}/upload`, {
+        if (!JOBS_ENABLED) {
+            // No durable job store / worker here (local store, serverless): stream the import
+            await streamFile(formData);
+            return;
+        }
+
+        // Large files run as a background job: the upload returns immediately with a job id
+        const response = await fetch(`${API_URL}/jobs`, {
             method: 'POST',
             body: formData
         });
-        const data = await response.json();
-        if (data.error) throw new Error(data.error);
+        const job = await response.json();
+        if (job.error) throw new Error(job.error);
 
-        currentData = data.results;
-        renderTable(currentData);
+        await followJob(job.job_id);
 
     } catch (e) {
         alert(e.message);
@@ -64,6 +74,250 @@ async function handleFile(file) {
     }
 }
 
+// --- Streamed Import ---
+// Rows arrive as they are classified; the total is only known once the file is read.
+async function streamFile(formData) {
+    currentJobId = null;
+    document.getElementById('progressContainer').style.display = 'block';
+    renderTable([]);
+    updateProgress(0, null);
+
+    const response = await fetch(`${API_URL}/upload/stream`, {
+        method: 'POST',
+        body: formData
+    });
+    await readNdjson(response, (msg) => {
+        if (msg.type === 'result') {
+            if (msg.index >= currentData.length) {
+                currentData.length = msg.index + 1;
+                scheduleRender(true);
+            }
+            setRow(msg.index, msg.result);
+            updateProgress(msg.processed, msg.total);
+        } else if (msg.type === 'done') {
+            currentData.length = msg.total;
+            scheduleRender(true);
+            updateProgress(msg.processed, msg.total);
+        }
+    });
+}
+
+// --- Background Job Polling ---
+// Fetches rows completed since the last cursor until the job is finished.
+// Survives server restarts: the job resumes server-side and polling just continues.
+async function followJob(jobId, intervalMs = 1000) {
+    currentJobId = jobId;
+    document.getElementById('progressContainer').style.display = 'block';
+
+    let cursor = 0;
+    renderTable([]);
+
+    while (true) {
+        const response = await fetch(`${API_URL}/jobs/${jobId}/results?cursor=${cursor}`);
+        const page = await response.json();
+        if (page.error) throw new Error(page.error);
+
+        if (currentData.length !== page.total) {
+            currentData.length = page.total;
+            scheduleRender(true);
+        }
+        page.results.forEach(({ index, result }) => setRow(index, result));
+        cursor = page.cursor;
+
+        updateProgress(page.processed, page.total);
+
+        if (page.status === 'error') throw new Error(page.error || "Erreur du traitement");
+        if (page.status === 'done' && !page.results.length) break;
+        if (!page.results.length) await new Promise(r => setTimeout(r, intervalMs));
+    }
+}
+
+// --- Streaming Batch (NDJSON) ---
+// Reads {"type": "start"|"result"|"done"} lines and hands each one to onMessage as soon as it arrives.
+// Non-2xx responses throw an HttpError (status + Retry-After) before anything is read.
+class HttpError extends Error {
+    constructor(status, message, retryAfterMs) {
+        super(message);
+        this.status = status;
+        this.retryAfterMs = retryAfterMs;
+    }
+}
+
+async function readNdjson(response, onMessage) {
+    if (!response.ok) {
+        let message = `HTTP ${response.status}`;
+        try { message = (await response.json()).error || message; } catch (_) { }
+        const retryAfter = parseFloat(response.headers.get('Retry-After'));
+        throw new HttpError(response.status, message, isNaN(retryAfter) ? null : retryAfter * 1000);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(l => l.trim()).forEach(l => onMessage(JSON.parse(l)));
+    }
+    if (buffer.trim()) onMessage(JSON.parse(buffer));
+}
+
+// --- Paste-list Request Pool ---
+// The list is cut into chunks, each sent to /api/batch/stream, with up to POOL_CONCURRENCY
+// requests in flight. A chunk writes into its own slots of currentData, so the table keeps the
+// list order whichever chunk answers first. On HTTP 429 / 5xx (or a cut stream) the pool halves
+// its concurrency, waits (Retry-After or exponential backoff) and re-sends only the rows it has
+// not received; each clean chunk gives one request back. Pause stops new chunks, Cancel aborts.
+const POOL_CHUNK_SIZE = 25;
+const POOL_CONCURRENCY = 4;
+const POOL_MAX_ATTEMPTS = 5;
+const POOL_BACKOFF_MS = 1000;
+const POOL_BACKOFF_MAX_MS = 30000;
+const POOL_POLL_MS = 200;
+let activePool = null;
+
+const sleep = (ms) => new Promise(r => setTimeout(r, ms));
+
+function isRetryable(error) {
+    if (error instanceof HttpError) return error.status === 429 || error.status >= 500;
+    return error.name !== 'AbortError'; // network failure / stream cut mid-way
+}
+
+function errorRow(input, message) {
+    return { "Input": input, "Nom Officiel": "Erreur", "Secteur": "Erreur", "Détail": message, "Source": "Client", "Score": "0", "Adresse": "-", "Région": "-", "Lien": "-" };
+}
+
+async function runPool(lines) {
+    const pool = {
+        lines,
+        queue: [],
+        limit: POOL_CONCURRENCY,
+        inFlight: 0,
+        processed: 0,
+        paused: false,
+        cancelled: false,
+        retryAt: 0,
+        backoff: POOL_BACKOFF_MS,
+        controllers: new Set(),
+    };
+    for (let start = 0; start < lines.length; start += POOL_CHUNK_SIZE) {
+        const end = Math.min(start + POOL_CHUNK_SIZE, lines.length);
+        pool.queue.push({ slots: Array.from({ length: end - start }, (_, i) => start + i), attempts: 0 });
+    }
+
+    activePool = pool;
+    currentJobId = null;
+    renderTable(new Array(lines.length));
+    updateProgress(0, lines.length);
+    updatePoolControls();
+
+    const worker = async () => {
+        while (!pool.cancelled) {
+            if (pool.paused || pool.inFlight >= pool.limit || Date.now() < pool.retryAt || !pool.queue.length) {
+                // Empty queue with requests in flight: a failing chunk may still be put back
+                if (!pool.queue.length && !pool.inFlight) return;
+                await sleep(POOL_POLL_MS);
+                continue;
+            }
+            await runChunk(pool, pool.queue.shift());
+        }
+    };
+
+    try {
+        await Promise.all(Array.from({ length: POOL_CONCURRENCY }, worker));
+    } finally {
+        if (pool.cancelled) {
+            // Drop the slots that never got a result
+            renderTable(currentData.filter(Boolean));
+        }
+        activePool = null;
+        updatePoolControls();
+    }
+}
+
+async function runChunk(pool, chunk) {
+    const controller = new AbortController();
+    const received = new Set();
+    pool.controllers.add(controller);
+    pool.inFlight++;
+
+    try {
+        const response = await fetch(`${API_URL}/batch/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ inputs: chunk.slots.map(i => pool.lines[i]) }),
+            signal: controller.signal
+        });
+        await readNdjson(response, (msg) => {
+            if (msg.type !== 'result' || pool.cancelled) return;
+            const slot = chunk.slots[msg.index];
+            if (slot === undefined || received.has(slot)) return;
+            received.add(slot);
+            setRow(slot, msg.result);
+            pool.processed++;
+            updateProgress(pool.processed, pool.lines.length);
+        });
+        if (received.size < chunk.slots.length) throw new Error("Flux interrompu");
+
+        // Healthy again: one more request in flight, backoff reset
+        pool.limit = Math.min(pool.limit + 1, POOL_CONCURRENCY);
+        pool.backoff = POOL_BACKOFF_MS;
+
+    } catch (e) {
+        if (pool.cancelled) return;
+        const missing = chunk.slots.filter(slot => !received.has(slot));
+        const attempts = chunk.attempts + 1;
+
+        if (!isRetryable(e) || attempts >= POOL_MAX_ATTEMPTS) {
+            console.error(e);
+            missing.forEach(slot => setRow(slot, errorRow(pool.lines[slot], e.message)));
+            pool.processed += missing.length;
+            updateProgress(pool.processed, pool.lines.length);
+            return;
+        }
+
+        pool.limit = Math.max(1, Math.floor(pool.limit / 2));
+        pool.retryAt = Math.max(pool.retryAt, Date.now() + (e.retryAfterMs ?? pool.backoff));
+        pool.backoff = Math.min(pool.backoff * 2, POOL_BACKOFF_MAX_MS);
+        pool.queue.unshift({ slots: missing, attempts });
+
+    } finally {
+        pool.inFlight--;
+        pool.controllers.delete(controller);
+    }
+}
+
+function togglePausePool() {
+    if (!activePool) return;
+    activePool.paused = !activePool.paused;
+    updatePoolControls();
+}
+
+function cancelPool() {
+    if (!activePool) return;
+    activePool.cancelled = true;
+    activePool.queue = [];
+    activePool.controllers.forEach(c => c.abort());
+    updatePoolControls();
+}
+
+function updatePoolControls() {
+    const controls = document.getElementById('poolControls');
+    if (!controls) return;
+    controls.style.display = activePool && !activePool.cancelled ? 'flex' : 'none';
+    const pauseBtn = document.getElementById('poolPauseBtn');
+    if (pauseBtn && activePool) {
+        pauseBtn.innerHTML = activePool.paused
+            ? '<i class="fa-solid fa-play"></i> Reprendre'
+            : '<i class="fa-solid fa-pause"></i> Pause';
+    }
+}
+
 // --- Single Search ---
 async function performSingleSearch() {
     const input = document.getElementById('singleInput').value.trim();
@@ -84,8 +338,8 @@ async function performSingleSearch() {
         const data = await response.json();
         // Add to the table (top)
         // Add to the table (top) - PREPEND to keep history
-        currentData = [data, ...currentData];
-        renderTable(currentData);
+        currentJobId = null;
+        renderTable([data, ...currentData]);
 
     } catch (e) {
         alert("Erreur de connexion : " + e.message);
@@ -119,41 +373,9 @@ async function processPaste() {
     btn.disabled = true;
     progressContainer.style.display = 'block';
 
-    // Clear previous results for new search
-    currentData = [];
-    renderTable(currentData);
-
-    // Init Progress
-    const total = lines.length;
-    let processed = 0;
-    updateProgress(0, total);
-
-    // Sequential Processing (Chunking client-side)
+    // Concurrent chunked requests: rows fill their slot as soon as they are classified
     try {
-        for (const line of lines) {
-            try {
-                // Call Single Item Endpoint
-                const response = await fetch(`${API_URL}/categorize`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ input: line })
-                });
-
-                if (!response.ok) throw new Error(`HTTP ${response.status}`);
-
-                const data = await response.json();
-
-                // Result Logic: Match list order (Append)
-                currentData = [...currentData, ...[data]];
-                renderTable(currentData);
-
-            } catch (innerError) {
-                console.error(`Error processing ${line}:`, innerError);
-            }
-
-            processed++;
-            updateProgress(processed, total);
-        }
+        await runPool(lines);
 
     } catch (e) {
         console.error(e);
@@ -169,125 +391,240 @@ async function processPaste() {
 }
 
 function updateProgress(current, total) {
-    const percent = Math.round((current / total) * 100);
+    const percent = total ? Math.round((current / total) * 100) : 0;
     const progressBar = document.getElementById('progressBar');
     const progressText = document.getElementById('progressText');
     const progressPercent = document.getElementById('progressPercent');
 
     if (progressBar) progressBar.style.width = `${percent}%`;
-    if (progressText) progressText.innerText = `${current} / ${total}`;
+    if (progressText) progressText.innerText = total == null ? `${current} / ?` : `${current} / ${total}`;
     if (progressPercent) progressPercent.innerText = `${percent}%`;
 }
 
+// --- Results Table (virtualized) ---
+// currentData holds the rows in input order; holes are rows still being classified.
+// Only the rows visible in the scroll container (plus an overscan margin) exist in the DOM,
+// between two spacer rows, so memory and layout cost stay flat for tens of thousands of rows.
+// Counters are updated row by row instead of recounting the whole list.
+const ROW_OVERSCAN = 20;
+let rowHeight = 57; // Re-measured on the first rendered row (td are single-line)
+let rowHeightMeasured = false;
+let tableStats = { found: 0, notFound: 0, error: 0, count: 0 };
+let renderedRange = null; // { first, last } of the rows currently in the DOM
+let renderFrame = null;
+let fullRenderPending = false;
+const dirtyRows = new Set();
+
+const tableContainer = document.querySelector('.table-container');
+tableContainer.addEventListener('scroll', () => scheduleRender(true), { passive: true });
+window.addEventListener('resize', () => scheduleRender(true));
+
+function rowStatus(row) {
+    if (row["Secteur"].includes("Erreur") || row["Secteur"] === "Error") return 'error';
+    if (row["Secteur"].includes("Non Trouvé") || row["Secteur"] === "Unknown") return 'notFound';
+    return 'found';
+}
+
+function countRow(row, delta) {
+    tableStats[rowStatus(row)] += delta;
+    tableStats.count += delta;
+}
+
+// Replaces the whole list (new batch, single search, edits of the sector list)
 function renderTable(data) {
-    const tbody = document.getElementById('tableBody');
     currentData = data;
+    tableStats = { found: 0, notFound: 0, error: 0, count: 0 };
+    currentData.forEach(row => { if (row) countRow(row, 1); });
+    scheduleRender(true);
+}
 
-    if (currentData.length === 0) {
-        document.getElementById('emptyState').style.display = 'block';
-        tbody.innerHTML = '';
-        document.getElementById('countTotal').innerText = 0;
-        document.getElementById('statFound').innerText = 0;
-        document.getElementById('statNotFound').innerText = 0;
-        document.getElementById('statError').innerText = 0;
-        return;
-    }
-    document.getElementById('emptyState').style.display = 'none';
+// Stores one result at its input index: only that row (if visible) and the counters are redrawn
+function setRow(index, row) {
+    const previous = currentData[index];
+    if (previous) countRow(previous, -1);
+    currentData[index] = row;
+    countRow(row, 1);
+    dirtyRows.add(index);
+    scheduleRender(false);
+}
 
-    let found = 0, notFound = 0, error = 0;
-    tbody.innerHTML = '';
+// Row content changed in place (edit mode, sector update)
+function refreshRow(index) {
+    dirtyRows.add(index);
+    scheduleRender(false);
+}
 
-    currentData.forEach(row => {
-        if (row["Secteur"].includes("Erreur") || row["Secteur"] === "Error") error++;
-        else if (row["Secteur"].includes("Non Trouvé") || row["Secteur"] === "Unknown") notFound++;
-        else found++;
+function scheduleRender(full) {
+    if (full) fullRenderPending = true;
+    if (renderFrame === null) renderFrame = requestAnimationFrame(flushRender);
+}
 
-        const tr = document.createElement('tr');
-        const index = currentData.indexOf(row);
+function flushRender() {
+    renderFrame = null;
+    const tbody = document.getElementById('tableBody');
 
-        let statusIcon = '<i class="fa-solid fa-circle-check status-icon success"></i>';
-        if (row["Secteur"].includes("Erreur") || row["Secteur"] === "Error") {
-            statusIcon = '<i class="fa-solid fa-circle-xmark status-icon error" style="color: var(--error);"></i>';
-        } else if (row["Secteur"].includes("Non Trouvé") || row["Secteur"] === "Unknown") {
-            statusIcon = '<i class="fa-solid fa-circle-exclamation status-icon warning" style="color: var(--warning);"></i>';
+    if (fullRenderPending || !renderedRange) {
+        fullRenderPending = false;
+        renderWindow(tbody);
+    } else {
+        // Incremental: patch visible rows that changed, resize the bottom spacer if the list grew
+        const { first, last } = renderedRange;
+        dirtyRows.forEach(index => {
+            if (index >= first && index < last) {
+                tbody.children[index - first + 1].replaceWith(buildRow(currentData[index], index));
+            }
+        });
+        if (dirtyRows.size && [...dirtyRows].some(index => index >= last) && last < visibleRange().last) {
+            renderWindow(tbody); // New rows landed right below the window while it is not full yet
+        } else {
+            tbody.lastChild.style.height = `${(currentData.length - last) * rowHeight}px`;
         }
+    }
+    dirtyRows.clear();
+    updateCounters();
+}
 
-        const sector = row["Secteur"] === "Unknown" ? "Non Trouvé" : row["Secteur"];
-        const region = row["Région"] || "Non renseigné";
-
-        let link = row["Lien"] && row["Lien"] !== "#" ? `<a href="${row["Lien"]}" target="_blank" class="link-btn">Voir <i class="fa-solid fa-arrow-up-right-from-square"></i></a>` : "-";
-        if (row["Adresse"] && (row["Adresse"].includes("USA") || row["Adresse"].includes("United States"))) {
-            link = '<span class="text-muted" title="Lien masqué pour USA">-</span>';
-        }
+function visibleRange() {
+    // The container may still be growing: render at least one screen of rows
+    const viewport = Math.max(tableContainer.clientHeight, window.innerHeight);
+    const first = Math.max(0, Math.floor(tableContainer.scrollTop / rowHeight) - ROW_OVERSCAN);
+    const last = Math.min(currentData.length, Math.ceil((tableContainer.scrollTop + viewport) / rowHeight) + ROW_OVERSCAN);
+    return { first, last };
+}
 
-        let sectorDisplay;
-        if (row._isEditing) {
-            const isCustom = typeof CUSTOM_SECTORS !== 'undefined' && CUSTOM_SECTORS.includes(sector);
-            let sectorSelect = `<div id="sector-container-${index}" class="edit-container" style="width:100%">
-                <select class="sector-select" onchange="if(this.value === 'CUSTOM') { switchToInput(${index}); } else { updateSector(${index}, this.value); }">`;
-
-            let currentInList = false;
-            ALL_SECTORS.forEach(s => {
-                const selected = s === row["Secteur"] ? "selected" : "";
-                if (selected) currentInList = true;
-                sectorSelect += `<option value="${s}" ${selected}>${s}</option>`;
-            });
-            if (!currentInList) sectorSelect += `<option value="${row["Secteur"]}" selected>${row["Secteur"]}</option>`;
-            sectorSelect += `<option value="CUSTOM" style="font-weight:bold; color:var(--primary-color);">✍️ Autre / Saisie libre...</option></select>`;
+function spacerRow(height) {
+    // Stands for the rows outside the window (a row without cells would collapse)
+    const tr = document.createElement('tr');
+    tr.className = 'spacer-row';
+    tr.style.height = `${height}px`;
+    tr.innerHTML = '<td colspan="7"></td>';
+    return tr;
+}
 
-            if (isCustom) {
-                const safeSector = sector.replace(/\\/g, '\\\\').replace(/'/g, "\\'").replace(/"/g, '&quot;');
-                sectorSelect += `<button class="delete-btn" onclick="event.stopPropagation(); deleteCustomSector('${safeSector}')" title="Supprimer"><i class="fa-solid fa-trash"></i></button>`;
-            }
-            sectorSelect += `<button class="cancel-btn" onclick="cancelEdit(${index})" title="Annuler"><i class="fa-solid fa-xmark"></i></button></div>`;
-            sectorDisplay = sectorSelect;
-        } else {
-            let competitorBadge = "";
-            if (row["IsCompetitor"]) {
-                competitorBadge = `<span class="competitor-alert" title="Concurrent Identifié">⚠️ Concurrent</span> `;
+function renderWindow(tbody) {
+    document.getElementById('emptyState').style.display = currentData.length === 0 ? 'block' : 'none';
+
+    const { first, last } = visibleRange();
+    const fragment = document.createDocumentFragment();
+    fragment.appendChild(spacerRow(first * rowHeight));
+    for (let i = first; i < last; i++) fragment.appendChild(buildRow(currentData[i], i));
+    fragment.appendChild(spacerRow((currentData.length - last) * rowHeight));
+    tbody.replaceChildren(fragment);
+    renderedRange = { first, last };
+
+    if (!rowHeightMeasured && last > first) {
+        const sample = tbody.children[1];
+        if (sample && sample.offsetHeight && !sample.querySelector('.edit-container')) {
+            rowHeightMeasured = true;
+            if (sample.offsetHeight !== rowHeight) {
+                rowHeight = sample.offsetHeight;
+                renderWindow(tbody);
             }
-            // PILL STYLE HERE
-            sectorDisplay = `
-                <div class="row-display" onclick="enableEdit(${index})">
-                    ${competitorBadge}
-                    <span class="sector-pill">${sector}</span>
-                    <i class="fa-solid fa-pen-to-square edit-icon"></i>
-                </div>
-            `;
         }
+    }
+}
+
+function updateCounters() {
+    document.getElementById('countTotal').innerText = tableStats.count;
+    document.getElementById('statFound').innerText = tableStats.found;
+    document.getElementById('statNotFound').innerText = tableStats.notFound;
+    document.getElementById('statError').innerText = tableStats.error;
+}
 
+function buildRow(row, index) {
+    const tr = document.createElement('tr');
+
+    if (!row) {
+        // Not classified yet
+        tr.className = 'pending-row';
         tr.innerHTML = `
-            <td>${statusIcon}</td>
-            <td>${row["Input"]}</td>
-            <td><strong>${row["Nom Officiel"]}</strong></td>
-            <td>${sectorDisplay}</td>
-            <td>${row["Adresse"]}</td>
-            <td>${region}</td>
-            <td>${link}</td>
+            <td><i class="fa-solid fa-spinner fa-spin status-icon"></i></td>
+            <td colspan="6" class="text-muted">En cours...</td>
         `;
-        tbody.appendChild(tr);
-    });
+        return tr;
+    }
+
+    let statusIcon = '<i class="fa-solid fa-circle-check status-icon success"></i>';
+    if (rowStatus(row) === 'error') {
+        statusIcon = '<i class="fa-solid fa-circle-xmark status-icon error" style="color: var(--error);"></i>';
+    } else if (rowStatus(row) === 'notFound') {
+        statusIcon = '<i class="fa-solid fa-circle-exclamation status-icon warning" style="color: var(--warning);"></i>';
+    }
+
+    const sector = row["Secteur"] === "Unknown" ? "Non Trouvé" : row["Secteur"];
+    const region = row["Région"] || "Non renseigné";
+
+    let link = row["Lien"] && row["Lien"] !== "#" ? `<a href="${row["Lien"]}" target="_blank" class="link-btn">Voir <i class="fa-solid fa-arrow-up-right-from-square"></i></a>` : "-";
+    if (row["Adresse"] && (row["Adresse"].includes("USA") || row["Adresse"].includes("United States"))) {
+        link = '<span class="text-muted" title="Lien masqué pour USA">-</span>';
+    }
+
+    let sectorDisplay;
+    if (row._isEditing) {
+        const isCustom = typeof CUSTOM_SECTORS !== 'undefined' && CUSTOM_SECTORS.includes(sector);
+        let sectorSelect = `<div id="sector-container-${index}" class="edit-container" style="width:100%">
+            <select class="sector-select" onchange="if(this.value === 'CUSTOM') { switchToInput(${index}); } else { updateSector(${index}, this.value); }">`;
+
+        let currentInList = false;
+        ALL_SECTORS.forEach(s => {
+            const selected = s === row["Secteur"] ? "selected" : "";
+            if (selected) currentInList = true;
+            sectorSelect += `<option value="${s}" ${selected}>${s}</option>`;
+        });
+        if (!currentInList) sectorSelect += `<option value="${row["Secteur"]}" selected>${row["Secteur"]}</option>`;
+        sectorSelect += `<option value="CUSTOM" style="font-weight:bold; color:var(--primary-color);">✍️ Autre / Saisie libre...</option></select>`;
+
+        if (isCustom) {
+            const safeSector = sector.replace(/\\/g, '\\\\').replace(/'/g, "\\'").replace(/"/g, '&quot;');
+            sectorSelect += `<button class="delete-btn" onclick="event.stopPropagation(); deleteCustomSector('${safeSector}')" title="Supprimer"><i class="fa-solid fa-trash"></i></button>`;
+        }
+        sectorSelect += `<button class="cancel-btn" onclick="cancelEdit(${index})" title="Annuler"><i class="fa-solid fa-xmark"></i></button></div>`;
+        sectorDisplay = sectorSelect;
+    } else {
+        let competitorBadge = "";
+        if (row["IsCompetitor"]) {
+            competitorBadge = `<span class="competitor-alert" title="Concurrent Identifié">⚠️ Concurrent</span> `;
+        }
+        // PILL STYLE HERE
+        sectorDisplay = `
+            <div class="row-display" onclick="enableEdit(${index})">
+                ${competitorBadge}
+                <span class="sector-pill">${sector}</span>
+                <i class="fa-solid fa-pen-to-square edit-icon"></i>
+            </div>
+        `;
+    }
 
-    document.getElementById('countTotal').innerText = currentData.length;
-    document.getElementById('statFound').innerText = found;
-    document.getElementById('statNotFound').innerText = notFound;
-    document.getElementById('statError').innerText = error;
+    tr.innerHTML = `
+        <td>${statusIcon}</td>
+        <td>${row["Input"]}</td>
+        <td><strong>${row["Nom Officiel"]}</strong></td>
+        <td>${sectorDisplay}</td>
+        <td>${row["Adresse"]}</td>
+        <td>${region}</td>
+        <td>${link}</td>
+    `;
+    return tr;
 }
 
-async function downloadExcel() {
-    if (currentData.length === 0) return;
+async function downloadExcel(format = 'xlsx', btn = null) {
+    const rows = currentData.filter(Boolean); // Skip rows still running
+    if (rows.length === 0) return;
 
-    const btn = document.querySelector('button[onclick="downloadExcel()"]');
+    btn = btn || document.querySelector('.export-actions button');
     const originalContent = btn.innerHTML;
     btn.innerHTML = '<i class="fa-solid fa-spinner fa-spin"></i> Export...';
     btn.disabled = true;
 
     try {
-        const response = await fetch(`${API_URL}/export_excel`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ results: currentData })
-        });
+        // Job results are exported from the server-side store: no need to upload them back
+        const response = currentJobId
+            ? await fetch(`${API_URL}/jobs/${currentJobId}/export?format=${format}`)
+            : await fetch(`${API_URL}/export_excel`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ results: rows, format })
+            });
 
         if (!response.ok) throw new Error("Erreur export");
 
@@ -295,10 +632,11 @@ async function downloadExcel() {
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
         a.href = url;
-        a.download = `enrichissement_export_${Date.now()}.xlsx`;
+        a.download = `enrichissement_export_${Date.now()}.${format}`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
+        window.URL.revokeObjectURL(url);
 
     } catch (e) {
         alert("Erreur lors de l'export Excel: " + e.message);
@@ -312,9 +650,12 @@ async function updateSector(index, newSector) {
     if (!newSector) return;
 
     const companyName = currentData[index]["Input"];
+    countRow(currentData[index], -1);
     currentData[index]["Secteur"] = newSector;
     currentData[index]._isEditing = false;
-    renderTable(currentData);
+    countRow(currentData[index], 1);
+    currentJobId = null; // The table now differs from the stored job results
+    refreshRow(index);
 
     try {
         const response = await fetch(`${API_URL}/override`, {
@@ -394,10 +735,10 @@ window.deleteCustomSector = deleteCustomSector;
 
 function enableEdit(index) {
     currentData[index]._isEditing = true;
-    renderTable(currentData);
+    refreshRow(index);
 }
 
 function cancelEdit(index) {
     currentData[index]._isEditing = false;
-    renderTable(currentData);
+    refreshRow(index);
 }
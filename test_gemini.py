@@ -1,29 +1,41 @@
+"""
+Manual check of the live Groq classification (real API call, needs GROQ_API_KEY in .env).
+Usage: python test_gemini.py [company]
+Not collected by pytest as a test: everything runs under __main__.
+"""
+import os
+import sys
 
 from dotenv import load_dotenv
-import os
-from ai_classifier import analyze_with_gemini
-from server import SECTOR_CONFIG
-
-# Load env vars
-load_dotenv()
-
-# Check for Key
-key = os.environ.get("GEMINI_API_KEY")
-if not key:
-    print("❌ Erreur : Clé GEMINI_API_KEY introuvable dans le fichier .env")
-    exit(1)
-else:
+
+
+def main():
+    # Load env vars (before ai_classifier reads GROQ_API_KEY)
+    load_dotenv()
+
+    # Check for Key
+    key = os.environ.get("GROQ_API_KEY")
+    if not key:
+        print("❌ Erreur : Clé GROQ_API_KEY introuvable dans le fichier .env")
+        sys.exit(1)
     print(f"✅ Clé trouvée : {key[:5]}...")
 
-# Test Case
-company = "Doctolib"
-print(f"\n🔍 Test de l'IA avec l'entreprise : '{company}'...")
+    import reference_data
+    from ai_classifier import analyze_with_groq
+
+    # Test Case
+    company = sys.argv[1] if len(sys.argv) > 1 else "Doctolib"
+    print(f"\n🔍 Test de l'IA avec l'entreprise : '{company}'...")
+
+    sector, detail, score = analyze_with_groq(company, reference_data.get().sectors)
+
+    if sector:
+        print("✅ Succès ! Groq a trouvé :")
+        print(f"   - Secteur : {sector}")
+        print(f"   - Détail : {detail}")
+    else:
+        print(f"❌ Échec : Groq n'a rien trouvé ({detail}).")
 
-sector, detail, score = analyze_with_gemini(company, list(SECTOR_CONFIG.keys()))
 
-if sector:
-    print(f"✅ Succès ! Gemini a trouvé :")
-    print(f"   - Secteur : {sector}")
-    print(f"   - Détail : {detail}")
-else:
-    print("❌ Échec : Gemini n'a rien trouvé (ou erreur).")
+if __name__ == "__main__":
+    main()